@@ -10,6 +10,16 @@ from flask_bootstrap import Bootstrap
 from flask_moment import Moment
 from flask_babel import Babel, lazy_gettext as _l
 from config import Config
+from app.assets import Assets
+from app.avatars import Avatars
+from app.caching import ResponseCache
+from app.instrumentation import Instrumentation
+from app.jobs import JobQueue
+from app.metrics import Metrics
+from app.reference import ReferenceCatalog
+from app.search import SearchIndex
+from app.presence import PresenceTracker
+from app.translate import Translator
 
 db = SQLAlchemy()
 migrate = Migrate()
@@ -20,6 +30,16 @@ mail = Mail()
 bootstrap = Bootstrap()
 moment = Moment()
 babel = Babel()
+jobs = JobQueue()
+catalog = ReferenceCatalog()
+presence = PresenceTracker()
+translator = Translator()
+search_index = SearchIndex()
+response_cache = ResponseCache()
+assets = Assets()
+avatars = Avatars()
+metrics = Metrics()
+instrumentation = Instrumentation()
 
 
 def create_app(config_class=Config):
@@ -33,6 +53,16 @@ def create_app(config_class=Config):
     bootstrap.init_app(app)
     moment.init_app(app)
     babel.init_app(app)
+    jobs.init_app(app)
+    catalog.init_app(app)
+    presence.init_app(app)
+    translator.init_app(app)
+    search_index.init_app(app)
+    response_cache.init_app(app)
+    assets.init_app(app)
+    avatars.init_app(app)
+    metrics.init_app(app)
+    instrumentation.init_app(app)
 
     from app.errors import bp as errors_bp
     app.register_blueprint(errors_bp)
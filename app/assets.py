@@ -0,0 +1,204 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+from io import BytesIO
+from flask import current_app, request, url_for, send_from_directory, has_request_context
+from werkzeug.security import safe_join
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt')
+MANIFEST = 'manifest.json'
+
+
+def fingerprint(data):
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def variant_name(filename, width=None, ext=None):
+    """Logical name of a variant: ``vineyards/alsace.png`` resized to 640
+    pixels as WebP is ``vineyards/alsace@640w.webp``."""
+    stem, original_ext = os.path.splitext(filename)
+    return '{}{}{}'.format(stem, '@{}w'.format(width) if width else '',
+                           ext or original_ext)
+
+
+class AssetBuilder(object):
+    """Writes fingerprinted copies of the static files and their variants.
+
+    Every output file is named after a hash of its content, so it can be
+    cached forever, and ``manifest.json`` maps the logical names used in
+    the templates to them. Images get resized and WebP variants when Pillow
+    is installed; text files get ``.gz`` (and ``.br`` with brotli) copies.
+    """
+
+    def __init__(self, source, target, widths=(), webp_quality=80):
+        self.source = source
+        self.target = target
+        self.widths = sorted(widths)
+        self.webp_quality = webp_quality
+        self.manifest = {}
+
+    def build(self):
+        os.makedirs(self.target, exist_ok=True)
+        for root, dirs, files in os.walk(self.source):
+            # never feed a previous build back into this one
+            dirs[:] = [d for d in dirs
+                       if os.path.abspath(os.path.join(root, d)) != os.path.abspath(self.target)]
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, self.source).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    data = f.read()
+                self.write(filename, data)
+                ext = os.path.splitext(name)[1].lower()
+                if ext in IMAGE_EXTENSIONS and Image is not None:
+                    self.image_variants(filename, path)
+        with open(os.path.join(self.target, MANIFEST), 'w') as f:
+            json.dump(self.manifest, f, indent=1, sort_keys=True)
+        return self.manifest
+
+    def write(self, filename, data):
+        stem, ext = os.path.splitext(filename)
+        built = '{}.{}{}'.format(stem, fingerprint(data), ext)
+        path = os.path.join(self.target, built)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(data)
+            if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                with open(path + '.gz', 'wb') as f:
+                    # mtime=0 keeps the output identical between builds
+                    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=9, mtime=0) as gz:
+                        gz.write(data)
+                if brotli is not None:
+                    with open(path + '.br', 'wb') as f:
+                        f.write(brotli.compress(data))
+        self.manifest[filename] = built
+
+    def image_variants(self, filename, path):
+        image = Image.open(path)
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        sizes = [None] + [width for width in self.widths if width < image.width]
+        for width in sizes:
+            resized = image
+            if width:
+                height = round(image.height * width / image.width)
+                resized = image.resize((width, height), Image.LANCZOS)
+                self.write(variant_name(filename, width), self.encode(resized, 'PNG'))
+            self.write(variant_name(filename, width, '.webp'), self.encode(resized, 'WEBP'))
+
+    def encode(self, image, image_format):
+        out = BytesIO()
+        if image_format == 'WEBP':
+            image.save(out, 'WEBP', quality=self.webp_quality, method=4)
+        else:
+            image.save(out, 'PNG')
+        return out.getvalue()
+
+
+class Assets(object):
+    """Serves the built assets with far-future, immutable cache headers.
+
+    ``asset_url`` is available in the templates; it falls back to the
+    plain static URL when the assets have not been built, so development
+    needs no build step.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_FOLDER', os.path.join(app.static_folder, 'build'))
+        app.config.setdefault('ASSETS_URL_PATH', '/assets')
+        app.config.setdefault('ASSETS_WIDTHS', [640, 1280])
+        app.config.setdefault('ASSETS_WEBP_QUALITY', 80)
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        manifest = self.load_manifest(app)
+        app.extensions['assets'] = {
+            'manifest': manifest,
+            'version': fingerprint(json.dumps(manifest, sort_keys=True).encode('utf-8')),
+        }
+        app.add_url_rule(app.config['ASSETS_URL_PATH'] + '/<path:filename>',
+                         'assets', send_asset)
+        app.add_template_global(asset_url)
+
+    @staticmethod
+    def load_manifest(app):
+        try:
+            with open(os.path.join(app.config['ASSETS_FOLDER'], MANIFEST)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    @staticmethod
+    def build(app):
+        builder = AssetBuilder(app.static_folder, app.config['ASSETS_FOLDER'],
+                               widths=app.config['ASSETS_WIDTHS'],
+                               webp_quality=app.config['ASSETS_WEBP_QUALITY'])
+        manifest = builder.build()
+        app.extensions['assets']['manifest'] = manifest
+        return manifest
+
+    @staticmethod
+    def clean(app):
+        shutil.rmtree(app.config['ASSETS_FOLDER'], ignore_errors=True)
+        app.extensions['assets']['manifest'] = {}
+
+
+def asset_url(filename, width=None):
+    """URL of the best built variant of a static file.
+
+    With ``width``, the smallest resized variant at least that wide is
+    used; WebP is preferred when the Accept header of the page request
+    lists it, as the major browsers do.
+    """
+    manifest = current_app.extensions['assets']['manifest']
+    if filename not in manifest:
+        return url_for('static', filename=filename)
+    candidates = [variant_name(filename, w) for w in sorted(current_app.config['ASSETS_WIDTHS'])
+                  if width and w >= width] + [filename]
+    # an explicit image/webp, a */* wildcard does not mean WebP support
+    webp = has_request_context() and 'image/webp' in request.accept_mimetypes.values()
+    for candidate in candidates:
+        if webp and variant_name(candidate, ext='.webp') in manifest:
+            candidate = variant_name(candidate, ext='.webp')
+        if candidate in manifest:
+            return url_for('assets', filename=manifest[candidate])
+    return url_for('assets', filename=manifest[filename])
+
+
+def send_asset(filename):
+    folder = current_app.config['ASSETS_FOLDER']
+    response = None
+    encodings = request.accept_encodings
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        path = safe_join(folder, filename + suffix)
+        if encodings[encoding] and path is not None and os.path.isfile(path):
+            response = send_from_directory(
+                folder, filename + suffix,
+                mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_from_directory(folder, filename)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['ASSETS_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,168 @@
+import colorsys
+import os
+import re
+import struct
+import zlib
+from hashlib import md5
+from flask import current_app, abort, send_file, url_for
+
+GRID = 5
+_digest = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + \
+        struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+
+def encode_png(width, height, rows):
+    """Minimal RGB PNG writer, ``rows`` are the raw scanlines."""
+    raw = b''.join(b'\x00' + row for row in rows)
+    return b''.join([
+        b'\x89PNG\r\n\x1a\n',
+        _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        _chunk(b'IDAT', zlib.compress(raw, 9)),
+        _chunk(b'IEND', b''),
+    ])
+
+
+def render_identicon(digest, size):
+    """5x5 mirrored identicon of an md5 hex digest, as PNG bytes.
+
+    The first 15 nibbles switch the cells of the three left columns on or
+    off (the two right ones mirror them) and the last 7 give the hue.
+    """
+    hue = int(digest[-7:], 16) / float(0xfffffff)
+    foreground = bytes(int(c * 255) for c in colorsys.hls_to_rgb(hue, 0.5, 0.55))
+    background = b'\xf0\xf0\xf0'
+    cells = [[int(digest[row * 3 + col], 16) % 2 == 0 for col in range(3)]
+             for row in range(GRID)]
+    cells = [row + row[1::-1] for row in cells]
+
+    margin = size // 12
+    cell = (size - 2 * margin) // GRID
+    margin = (size - cell * GRID) // 2
+    blank = background * size
+    rows = []
+    for y in range(size):
+        grid_y = (y - margin) // cell if margin <= y < margin + cell * GRID else None
+        if grid_y is None:
+            rows.append(blank)
+            continue
+        # every scanline of a grid row is the same, build it once
+        if y == margin + grid_y * cell:
+            line = background * margin + b''.join(
+                (foreground if on else background) * cell for on in cells[grid_y])
+            line += background * (size - len(line) // 3)
+        rows.append(line)
+    return encode_png(size, size, rows)
+
+
+def email_hash(email):
+    return md5(email.lower().encode('utf-8')).hexdigest()
+
+
+class Avatars(object):
+    """Avatar URLs, from gravatar.com or rendered by the application.
+
+    With ``AVATAR_BACKEND = 'identicon'`` the identicons are drawn here
+    and served with immutable cache headers: the URL holds the digest, so
+    a new email gets a new URL. Only the ``AVATAR_SIZES`` used by the
+    templates are served. The identicons of the users are drawn once into
+    ``AVATAR_CACHE_DIR``, which keeps the ``AVATAR_CACHE_MAX_FILES`` most
+    recently drawn; any other digest is drawn for the request only. The
+    directory is walked for eviction once every ``AVATAR_EVICT_INTERVAL``
+    files a worker stores, so it may briefly hold a few more.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('AVATAR_BACKEND', 'gravatar')
+        app.config.setdefault('AVATAR_CACHE_DIR', os.path.join(app.instance_path, 'avatars'))
+        app.config.setdefault('AVATAR_SIZES', [70, 128, 200, 256])
+        app.config.setdefault('AVATAR_CACHE_MAX_FILES', 10000)
+        app.config.setdefault('AVATAR_EVICT_INTERVAL', 100)
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        app.extensions['avatars'] = {'stored': 0}
+        app.add_url_rule('/avatar/<digest>/<int:size>.png', 'avatar', send_identicon)
+
+    @staticmethod
+    def url(digest, size):
+        if current_app.config['AVATAR_BACKEND'] == 'identicon':
+            return url_for('avatar', digest=digest, size=size)
+        return 'https://www.gravatar.com/avatar/{}?d=identicon&s={}'.format(digest, size)
+
+    @staticmethod
+    def backfill():
+        from app import db
+        from app.models import User
+        users = User.query.filter(User.avatar_hash.is_(None), User.email.isnot(None)).all()
+        for user in users:
+            user.avatar_hash = email_hash(user.email)
+        db.session.commit()
+        return len(users)
+
+
+def identicon_path(digest, size):
+    return os.path.join(current_app.config['AVATAR_CACHE_DIR'], digest[:2],
+                        '{}-{}.png'.format(digest, size))
+
+
+def store_identicon(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # concurrent workers may draw the same file, the rename is atomic
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    state = current_app.extensions['avatars']
+    state['stored'] += 1
+    if state['stored'] >= current_app.config['AVATAR_EVICT_INTERVAL']:
+        state['stored'] = 0
+        evict(current_app.config['AVATAR_CACHE_DIR'],
+              current_app.config['AVATAR_CACHE_MAX_FILES'])
+
+
+def evict(folder, max_files):
+    """Delete the least recently drawn identicons beyond ``max_files``."""
+    files = []
+    for root, dirs, names in os.walk(folder):
+        for name in names:
+            if name.endswith('.png'):
+                path = os.path.join(root, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+    files.sort()
+    for _, path in files[:max(0, len(files) - max_files)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def is_user_digest(digest):
+    from app import db
+    from app.models import User
+    return db.session.query(User.id).filter_by(avatar_hash=digest).first() is not None
+
+
+def send_identicon(digest, size):
+    if not _digest.match(digest) or size not in current_app.config['AVATAR_SIZES']:
+        abort(404)
+    path = identicon_path(digest, size)
+    if not os.path.exists(path):
+        data = render_identicon(digest, size)
+        if not is_user_digest(digest):
+            # anyone can ask for any digest, only the users' get a file
+            return current_app.response_class(data, mimetype='image/png')
+        store_identicon(path, data)
+    response = send_file(path, mimetype='image/png')
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config['ASSETS_MAX_AGE']
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,122 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request, session, g, make_response, render_template
+from flask_login import current_user
+from jinja2 import Markup
+
+
+class LRUCache(object):
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.data.move_to_end(key)
+            return self.data[key]
+
+    def set(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def _templates_stamp(app):
+    # a deploy that changes a template must also change the ETags
+    stamp = 0
+    for root, dirs, files in os.walk(os.path.join(app.root_path, app.template_folder)):
+        for name in files:
+            stamp = max(stamp, os.stat(os.path.join(root, name)).st_mtime_ns)
+    return str(stamp)
+
+
+class ResponseCache(object):
+    """HTTP and fragment caching of the pages built from reference data.
+
+    Pages decorated with :func:`reference_page` get a strong ETag derived
+    from the reference data version, the templates and built assets, the
+    locale, the user and the URL, and are answered with ``304 Not
+    Modified`` when the client already has them. Table rows are rendered through
+    :func:`render_fragment`, which keeps them in a bounded LRU keyed by
+    template, row id, locale and reference version.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FRAGMENT_CACHE_SIZE', 4096)
+        app.extensions['response_cache'] = {
+            'fragments': LRUCache(app.config['FRAGMENT_CACHE_SIZE']),
+            'stamp': _templates_stamp(app),
+        }
+        app.add_template_global(render_fragment)
+
+    @property
+    def fragments(self):
+        return current_app.extensions['response_cache']['fragments']
+
+
+def reference_etag():
+    from app import catalog
+    parts = [str(catalog.data.version),
+             current_app.extensions['response_cache']['stamp'],
+             current_app.extensions.get('assets', {}).get('version', ''),
+             str(g.get('locale', '')),
+             current_user.get_id() or '',
+             request.full_path]
+    return hashlib.sha1('\0'.join(parts).encode('utf-8')).hexdigest()
+
+
+def reference_page(f):
+    """Conditional GET for a view that only depends on the reference data."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        # a pending flash message has to be rendered, never skipped
+        if request.method != 'GET' or session.get('_flashes'):
+            return f(*args, **kwargs)
+        from app import catalog
+        etag = reference_etag()
+        if request.if_none_match.contains(etag):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            if catalog.data.timestamp is not None:
+                response.last_modified = catalog.data.timestamp
+        response.set_etag(etag)
+        # the navbar is personal: browsers may keep the page, proxies may not
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    return decorated
+
+
+def render_fragment(template, **context):
+    """Render ``template`` for one reference row (the only context value,
+    which must have an ``id``), reusing earlier renderings."""
+    from app import catalog, response_cache
+    (name, obj), = context.items()
+    key = (template, obj.id, str(g.get('locale', '')), catalog.data.version)
+    html = response_cache.fragments.get(key)
+    if html is None:
+        html = Markup(render_template(template, **context))
+        response_cache.fragments.set(key, html)
+    return html
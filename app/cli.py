@@ -33,3 +33,166 @@ def register(app):
         """Compile all languages."""
         if os.system('pybabel compile -d app/translations'):
             raise RuntimeError('compile command failed')
+
+    @app.cli.group()
+    def reference():
+        """Reference data (grapes and AOCs) commands."""
+        pass
+
+    @reference.command()
+    def reload():
+        """Bump the reference data version so every worker reloads it."""
+        from app import catalog
+        catalog.bump()
+
+    @reference.command('import')
+    @click.argument('kind', type=click.Choice(['grapes', 'aocs']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--batch-size', default=500, help='Rows written per transaction.')
+    @click.option('--delete-missing', is_flag=True,
+                  help='Delete the AOCs missing from a complete AOC snapshot.')
+    def import_(kind, path, batch_size, delete_missing):
+        """Insert or update grapes or AOCs from a TSV file or an AOC snapshot."""
+        from app import catalog
+        from app.importers import import_file
+        counts, errors = import_file(kind, path, batch_size=batch_size,
+                                     delete_missing=delete_missing)
+        for line, message in errors:
+            click.echo(message if line is None else 'line {}: {}'.format(line, message),
+                       err=True)
+        click.echo('{inserted} inserted, {updated} updated, {unchanged} unchanged, '
+                   '{deleted} deleted'.format(**counts))
+        if counts['inserted'] or counts['updated'] or counts['deleted']:
+            catalog.bump()
+
+    @reference.command()
+    @click.argument('path', type=click.Path(dir_okay=False))
+    def snapshot(path):
+        """Download the Wikipedia list of AOCs for `flask reference import aocs`."""
+        from app.importers import fetch_aoc_snapshot
+        fetch_aoc_snapshot(path)
+
+    @app.cli.group()
+    def stats():
+        """Player statistics commands."""
+        pass
+
+    @stats.command()
+    def rebuild():
+        """Recompute the player statistics and leaderboards from the finished games."""
+        from app.models import PlayerStats, LeaderboardEntry
+        PlayerStats.rebuild()
+        LeaderboardEntry.rebuild()
+
+    @app.cli.group()
+    def timeline():
+        """Home timeline commands."""
+        pass
+
+    @timeline.command()
+    def rebuild():
+        """Rebuild every home timeline from the followers table."""
+        from app.models import TimelineEntry
+        TimelineEntry.rebuild()
+
+    @app.cli.group()
+    def language():
+        """Post language detection commands."""
+        pass
+
+    @language.command()
+    def backfill():
+        """Detect the language of every post that does not have one yet."""
+        from app.language import backfill_languages
+        click.echo('{} posts updated'.format(backfill_languages()))
+
+    @app.cli.group()
+    def jobs():
+        """Background job queue commands."""
+        pass
+
+    @jobs.command()
+    def work():
+        """Run queued jobs in the foreground until interrupted."""
+        import time
+        from app import jobs
+        while True:
+            if not jobs.run_pending():
+                time.sleep(app.config['JOB_POLL_INTERVAL'])
+
+    @jobs.command()
+    def status():
+        """Show the number of jobs in each state."""
+        from app import jobs
+        for state, count in jobs.store.counts():
+            click.echo('{}: {}'.format(state, count))
+
+    @jobs.command()
+    @click.option('--days', default=7, help='Age of the finished jobs to delete.')
+    def purge(days):
+        """Delete finished jobs older than a number of days."""
+        import time
+        from app import jobs
+        click.echo('{} jobs deleted'.format(jobs.store.purge(time.time() - days * 86400)))
+
+    @app.cli.group()
+    def search():
+        """Full text search commands."""
+        pass
+
+    @search.command()
+    def reindex():
+        """Rebuild the search index of grapes, AOCs and posts."""
+        from app import search_index
+        from app.models import Grape, AOC, Post
+        for model in (Grape, AOC, Post):
+            search_index.reindex(model)
+
+    @app.cli.group()
+    def assets():
+        """Static asset pipeline commands."""
+        pass
+
+    @assets.command()
+    def build():
+        """Write fingerprinted, resized and compressed copies of the static files."""
+        from app.assets import Assets, Image, brotli
+        if Image is None:
+            click.echo('Pillow is not installed, skipping the resized and WebP images', err=True)
+        if brotli is None:
+            click.echo('brotli is not installed, skipping the .br files', err=True)
+        click.echo('{} assets built'.format(len(Assets.build(app))))
+
+    @assets.command()
+    def clean():
+        """Delete the built assets."""
+        from app.assets import Assets
+        Assets.clean(app)
+
+    @app.cli.group()
+    def avatars():
+        """Avatar commands."""
+        pass
+
+    @avatars.command()
+    def backfill():
+        """Store the avatar digest of the users created before it was kept."""
+        from app.avatars import Avatars
+        click.echo('{} users updated'.format(Avatars.backfill()))
+
+    @avatars.command()
+    def clean():
+        """Delete the rendered identicons."""
+        import shutil
+        shutil.rmtree(app.config['AVATAR_CACHE_DIR'], ignore_errors=True)
+
+    @app.cli.group()
+    def metrics():
+        """Application metrics commands."""
+        pass
+
+    @metrics.command()
+    def clean():
+        """Delete the per worker metrics files, before starting the server."""
+        from app.metrics import Metrics
+        Metrics.clean(app)
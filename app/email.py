@@ -1,17 +1,38 @@
-from threading import Thread
 from flask import current_app
 from flask_mail import Message
 from app import mail
+from app.jobs import task
 
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+@task('send_email', batch=True)
+def deliver_emails(messages):
+    # the whole batch goes through a single SMTP connection, and a message
+    # that fails is retried on its own without sending the others again
+    if not current_app.config['MAIL_SERVER'] and \
+            not current_app.extensions['mail'].suppress:
+        # the bodies are not logged, they may hold password reset tokens
+        for message in messages:
+            current_app.logger.info('Email to %s: %s', ', '.join(message['recipients']),
+                                    message['subject'])
+        return
+    errors = []
+    with mail.connect() as conn:
+        for message in messages:
+            msg = Message(message['subject'], sender=message['sender'],
+                          recipients=message['recipients'])
+            msg.body = message['text_body']
+            msg.html = message['html_body']
+            try:
+                conn.send(msg)
+            except Exception as e:
+                current_app.logger.exception('Email to %s failed', ', '.join(message['recipients']))
+                errors.append(e)
+            else:
+                errors.append(None)
+    return errors
 
 
 def send_email(subject, sender, recipients, text_body, html_body):
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
-    Thread(target=send_async_email,
-           args=(current_app._get_current_object(), msg)).start()
+    from app import jobs
+    jobs.enqueue('send_email', subject=subject, sender=sender, recipients=recipients,
+                 text_body=text_body, html_body=html_body)
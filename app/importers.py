@@ -0,0 +1,311 @@
+import csv
+import re
+from collections import Counter
+from html.parser import HTMLParser
+import requests
+from app import db, styles
+from app.models import Grape, AOC
+
+TRUE_VALUES = {'true', '1', 'x', 'yes', 'oui'}
+FALSE_VALUES = {'false', '0', '', 'no', 'non'}
+
+# column of static_data.tsv feeding each Grape attribute
+GRAPE_HEADERS = {
+    'id': 'id',
+    'name': u'Nom du cépage',
+    'color': u'Cépage',
+    'regions': u'Régions',
+    'vineyards': 'Vignobles',
+    'departments': u'Sous-régions',
+    'area_fr': 'Superficie en France (ha)',
+    'area_world': 'Superficie mondiale (ha)',
+}
+GRAPE_COLORS = {'Noir': True, 'Blanc': False, 'Gris': False}
+
+AOC_HEADERS = ['id', 'name', 'vineyard'] + [name for name, bit in styles.FLAGS]
+
+_separators = re.compile(r'\s+')
+
+
+def parse_int(value, required=False):
+    # areas are written with thin spaces as thousands separators
+    value = _separators.sub('', value or '')
+    if required and not value:
+        raise ValueError('missing value')
+    return int(value) if value else None
+
+
+def parse_bool(value):
+    value = (value or '').strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError('invalid boolean {!r}'.format(value))
+
+
+def parse_text(value, required=False):
+    value = ' '.join((value or '').split())
+    if required and not value:
+        raise ValueError('missing value')
+    return value
+
+
+def read_tsv(lines, headers, parse, errors):
+    """Yield the parsed rows of a TSV stream.
+
+    Rows ``parse`` rejects are skipped and reported in ``errors`` as
+    ``(line number, message)``.
+    """
+    reader = csv.DictReader(lines, delimiter='\t')
+    missing = [header for header in headers if header not in (reader.fieldnames or [])]
+    if missing:
+        errors.append((1, 'missing columns: {}'.format(', '.join(missing))))
+        return
+    for row in reader:
+        try:
+            yield parse(row)
+        except (ValueError, KeyError) as e:
+            errors.append((reader.line_num, str(e)))
+
+
+def parse_grape(row):
+    color = parse_text(row[GRAPE_HEADERS['color']], required=True)
+    if color not in GRAPE_COLORS:
+        raise ValueError('unknown grape color {!r}'.format(color))
+    return {
+        'id': parse_int(row['id'], required=True),
+        'name': parse_text(row[GRAPE_HEADERS['name']], required=True),
+        'red': GRAPE_COLORS[color],
+        'regions': parse_text(row[GRAPE_HEADERS['regions']]),
+        'vineyards': parse_text(row[GRAPE_HEADERS['vineyards']]),
+        'departments': parse_text(row[GRAPE_HEADERS['departments']]),
+        'area_fr': parse_int(row[GRAPE_HEADERS['area_fr']]),
+        'area_world': parse_int(row[GRAPE_HEADERS['area_world']]),
+    }
+
+
+def parse_aoc(row):
+    return {
+        'id': parse_int(row['id'], required=True),
+        'name': parse_text(row['name'], required=True),
+        'vineyard': parse_text(row['vineyard']),
+        'style': styles.pack(**{name: parse_bool(row[name]) for name, bit in styles.FLAGS}),
+    }
+
+
+def read_grapes(lines, errors):
+    return read_tsv(lines, GRAPE_HEADERS.values(), parse_grape, errors)
+
+
+def read_aocs(lines, errors):
+    return read_tsv(lines, AOC_HEADERS, parse_aoc, errors)
+
+
+def upsert(model, rows, batch_size=500, key='id'):
+    """Insert or update ``rows`` (dicts keyed by column, with a ``key``).
+
+    Rows are matched to the stored ones by their ``key`` column, the id
+    unless the source has a better natural key. They are handled
+    ``batch_size`` at a time: one SELECT of the existing rows, one bulk
+    insert, one bulk update and one commit per batch. Rows identical to
+    the stored ones are not written, so a second run of the same file
+    changes nothing. Returns the counts of inserted, updated and unchanged
+    rows.
+    """
+    counts = Counter(inserted=0, updated=0, unchanged=0, deleted=0)
+    batch = {}
+    for row in rows:
+        batch[row[key]] = row
+        if len(batch) >= batch_size:
+            _upsert_batch(model, batch, counts, key)
+            batch = {}
+    if batch:
+        _upsert_batch(model, batch, counts, key)
+    return counts
+
+
+def _upsert_batch(model, batch, counts, key):
+    table = model.__table__
+    existing = {row[key]: row for row in db.session.execute(
+        table.select().where(table.c[key].in_(list(batch))))}
+    inserts, updates = [], []
+    for value, row in batch.items():
+        current = existing.get(value)
+        if current is None:
+            inserts.append(row)
+        elif any(current[column] != new for column, new in row.items()):
+            updates.append(dict(row, id=current.id))
+        else:
+            counts['unchanged'] += 1
+    if inserts:
+        db.session.bulk_insert_mappings(model, inserts)
+    if updates:
+        db.session.bulk_update_mappings(model, updates)
+    db.session.commit()
+    counts['inserted'] += len(inserts)
+    counts['updated'] += len(updates)
+
+
+AOC_URL = 'https://fr.wikipedia.org/wiki/Vin_fran%C3%A7ais_b%C3%A9n%C3%A9ficiant_d%27une_AOC'
+
+STOP_WORDS = {'sur', 'sous', 'le', 'la', 'les', 'de', 'du', 'des', 'ou'}
+_word = re.compile(r'\w+')
+
+
+def capitalize_wine_title(title, stop_words=STOP_WORDS):
+    words = _word.findall(title.lower())
+    punctuations = _word.sub('', title)
+    result = ''
+    for i, word in enumerate(words):
+        result += word if word in stop_words else word.capitalize()
+        if i != len(words) - 1:
+            result += punctuations[i] if i < len(punctuations) else ' '
+    return result
+
+
+class FirstTableParser(HTMLParser):
+    """Collects the cell texts of the first table of the article body.
+
+    Rows are appended to ``rows`` as they are closed and ``done`` is set
+    once the table ends, so the caller can stop feeding the document.
+    """
+
+    def __init__(self, container_id='mw-content-text'):
+        super(FirstTableParser, self).__init__(convert_charrefs=True)
+        self.container_id = container_id
+        self.in_container = False
+        self.depth = 0
+        self.rows = []
+        self.row = None
+        self.cell = None
+        self.done = False
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if not self.in_container:
+            self.in_container = dict(attrs).get('id') == self.container_id
+            return
+        if tag == 'table':
+            self.depth += 1
+        elif self.depth == 1 and tag == 'tr':
+            self.row = []
+        elif self.depth == 1 and tag == 'td' and self.row is not None:
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        if self.done or not self.depth:
+            return
+        if tag == 'table':
+            self.depth -= 1
+            self.done = self.depth == 0
+        elif self.depth == 1 and tag == 'td' and self.cell is not None:
+            self.row.append(''.join(self.cell).replace('\n', ''))
+            self.cell = None
+        elif self.depth == 1 and tag == 'tr' and self.row is not None:
+            self.rows.append(self.row)
+            self.row = None
+
+    def handle_data(self, data):
+        if self.cell is not None:
+            self.cell.append(data)
+
+
+def fetch_aoc_snapshot(path, url=AOC_URL):
+    """Save the Wikipedia AOC list to ``path``, the only step that needs network."""
+    r = requests.get(url, timeout=30)
+    r.raise_for_status()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(r.text)
+
+
+def read_aoc_snapshot(stream, errors, chunk_size=65536):
+    """Yield the AOC rows of a saved copy of the Wikipedia AOC list.
+
+    Only the first table is parsed: the document is fed in chunks and the
+    parser is dropped as soon as the table is closed. The rows have no id,
+    as the positions in the table shift whenever an appellation is added:
+    sync them by ``name``. Errors are reported by row position.
+    """
+    parser = FirstTableParser()
+    index = 0
+    for chunk in iter(lambda: stream.read(chunk_size), ''):
+        parser.feed(chunk)
+        rows, parser.rows = parser.rows, []
+        for cells in rows:
+            if not cells:
+                # header rows only have <th> cells
+                continue
+            index += 1
+            if len(cells) < 8:
+                errors.append((index, 'expected 8 cells, got {}'.format(len(cells))))
+                continue
+            # names were stored capitalized this way by the first import
+            name, vineyard = [capitalize_wine_title(cell).capitalize() for cell in cells[:2]]
+            if not name:
+                errors.append((index, 'missing value'))
+                continue
+            yield {
+                'name': name,
+                'vineyard': vineyard,
+                'style': styles.pack(**{flag: cell.strip() != '' for (flag, bit), cell
+                                        in zip(styles.FLAGS, cells[2:8])}),
+            }
+        if parser.done:
+            break
+
+
+def sync(model, rows, errors, batch_size=500, key='id'):
+    """Like :func:`upsert`, but also deletes the rows missing from ``rows``.
+
+    Nothing is deleted when ``errors`` reports a rejected row or when
+    ``rows`` is empty: a skipped row or a page whose layout changed would
+    otherwise delete valid data.
+    """
+    seen = set()
+
+    def track(rows):
+        for row in rows:
+            seen.add(row[key])
+            yield row
+
+    counts = upsert(model, track(rows), batch_size=batch_size, key=key)
+    if errors or not seen:
+        errors.append((None, 'incomplete source, no rows deleted'))
+        return counts
+    column = getattr(model, key)
+    stale = [id_ for id_, value in db.session.query(model.id, column) if value not in seen]
+    for i in range(0, len(stale), batch_size):
+        model.query.filter(model.id.in_(stale[i:i + batch_size])).delete(
+            synchronize_session=False)
+    db.session.commit()
+    counts['deleted'] = len(stale)
+    return counts
+
+
+LOADERS = {
+    'grapes': (Grape, read_grapes),
+    'aocs': (AOC, read_aocs),
+}
+
+
+def import_file(kind, path, batch_size=500, delete_missing=False):
+    """Load a TSV file of grapes or AOCs, returns ``(counts, errors)``.
+
+    A saved HTML page of the Wikipedia AOC list is matched by name. With
+    ``delete_missing``, it is a complete snapshot: AOCs missing from it are
+    deleted, unless it could not be fully read.
+    """
+    model, read = LOADERS[kind]
+    errors = []
+    with open(path, encoding='utf-8', newline='') as f:
+        if kind == 'aocs' and path.endswith(('.html', '.htm')):
+            rows = read_aoc_snapshot(f, errors)
+            if delete_missing:
+                counts = sync(model, rows, errors, batch_size=batch_size, key='name')
+            else:
+                counts = upsert(model, rows, batch_size=batch_size, key='name')
+        else:
+            counts = upsert(model, read(f, errors), batch_size=batch_size)
+    return counts, errors
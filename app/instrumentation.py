@@ -0,0 +1,113 @@
+import heapq
+import logging
+from time import perf_counter
+from flask import current_app, request, g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class RequestStats(object):
+    def __init__(self, slowest):
+        self.queries = 0
+        self.duration = 0.0
+        self.slowest = []
+        self.size = slowest
+        self.started = perf_counter()
+
+    def add(self, statement, duration):
+        self.queries += 1
+        self.duration += duration
+        entry = (duration, self.queries, statement)
+        if len(self.slowest) < self.size:
+            heapq.heappush(self.slowest, entry)
+        elif self.slowest and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # a connection runs one statement at a time, a single slot is enough
+    conn.info['query_start'] = perf_counter()
+
+
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    if context.connection is not None:
+        context.connection.info.pop('query_start', None)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop('query_start', None)
+    if started is None:
+        return
+    duration = perf_counter() - started
+    if not has_app_context() or 'instrumentation' not in current_app.extensions:
+        return
+    stats = g.get('sql_stats') if has_request_context() else None
+    if stats is not None:
+        stats.add(statement, duration)
+    if duration >= current_app.config['SLOW_QUERY_THRESHOLD']:
+        from app import metrics
+        metrics.inc('db_slow_queries_total')
+        current_app.logger.warning(
+            'slow_query duration_ms=%.1f endpoint=%s statement="%s"', duration * 1000,
+            request.endpoint if has_request_context() else '-', ' '.join(statement.split()))
+
+
+class Instrumentation(object):
+    """Counts and times the SQL statements run for every request.
+
+    The engine events time each statement. The request hooks add up the
+    statements of the request and keep the slowest ``SQL_STATS_SLOWEST``.
+    The totals are sent back as ``X-DB-Queries``, ``X-DB-Time`` and
+    ``Server-Timing`` headers when ``SQL_STATS_HEADERS`` is on (the default
+    in debug) and counted per endpoint in the application metrics.
+    Otherwise they are logged at DEBUG level, or at INFO level for the
+    requests slower than ``SLOW_QUERY_THRESHOLD`` seconds. Statements
+    slower than the threshold are logged as warnings, including those of
+    the CLI and the job workers.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_QUERY_THRESHOLD', 0.5)
+        app.config.setdefault('SQL_STATS_SLOWEST', 3)
+        app.config.setdefault('SQL_STATS_HEADERS', app.debug)
+        app.extensions['instrumentation'] = {}
+        # the listeners are global, they look up the app of the statement
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            event.listen(Engine, 'handle_error', _handle_error)
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+
+    @staticmethod
+    def start_request():
+        g.sql_stats = RequestStats(current_app.config['SQL_STATS_SLOWEST'])
+
+    @staticmethod
+    def end_request(response):
+        stats = g.pop('sql_stats', None)
+        if stats is None:
+            return response
+        from app import metrics
+        metrics.inc('db_queries_total', stats.queries, endpoint=request.endpoint or '-')
+        metrics.inc('db_query_seconds_total', stats.duration, endpoint=request.endpoint or '-')
+        if current_app.config['SQL_STATS_HEADERS']:
+            response.headers['X-DB-Queries'] = str(stats.queries)
+            response.headers['X-DB-Time'] = '{:.1f}'.format(stats.duration * 1000)
+            response.headers['Server-Timing'] = 'db;dur={:.1f}'.format(stats.duration * 1000)
+        else:
+            elapsed = perf_counter() - stats.started
+            slow = elapsed >= current_app.config['SLOW_QUERY_THRESHOLD']
+            current_app.logger.log(
+                logging.INFO if slow else logging.DEBUG,
+                '%s endpoint=%s status=%d queries=%d db_ms=%.1f total_ms=%.1f slowest_ms=%s',
+                'slow_request' if slow else 'request', request.endpoint, response.status_code,
+                stats.queries, stats.duration * 1000, elapsed * 1000,
+                ','.join('{:.1f}'.format(entry[0] * 1000)
+                         for entry in sorted(stats.slowest, reverse=True)) or '-')
+        return response
@@ -0,0 +1,240 @@
+import json
+import sqlite3
+import threading
+import uuid
+from time import time
+from flask import current_app
+
+TASKS = {}
+
+
+def task(name=None, batch=False):
+    """Register a function as a job.
+
+    Batch tasks receive a list with the keyword arguments of up to
+    ``JOB_BATCH_SIZE`` queued jobs of the same name, so they can share a
+    connection (SMTP for instance) across them. A batch task may return a
+    list with one exception (or None) per job: only the jobs that failed
+    are retried.
+    """
+    def decorator(f):
+        TASKS[name or f.__name__] = (f, batch)
+        return f
+    return decorator
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS job (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    args TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at REAL NOT NULL,
+    claim TEXT,
+    claimed_at REAL,
+    error TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_job_ready ON job (status, run_at);
+"""
+
+
+class JobStore(object):
+    """Job table in a standalone SQLite file shared by every worker process."""
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        conn = self.connect()
+        conn.executescript(SCHEMA)
+        if 'claimed_at' not in [row[1] for row in conn.execute('PRAGMA table_info(job)')]:
+            # job files created before the leases
+            conn.execute('ALTER TABLE job ADD COLUMN claimed_at REAL')
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self.local.conn = conn
+        return conn
+
+    def push(self, name, args, delay=0):
+        now = time()
+        cursor = self.connect().execute(
+            'INSERT INTO job (name, args, run_at, created) VALUES (?, ?, ?, ?)',
+            (name, json.dumps(args), now + delay, now))
+        return cursor.lastrowid
+
+    def claim(self, limit):
+        # claiming is one UPDATE statement, atomic across processes
+        claim = uuid.uuid4().hex
+        conn = self.connect()
+        now = time()
+        conn.execute(
+            "UPDATE job SET status = 'running', claim = ?, claimed_at = ? WHERE id IN ("
+            "  SELECT id FROM job WHERE status = 'queued' AND run_at <= ? AND name = ("
+            "    SELECT name FROM job WHERE status = 'queued' AND run_at <= ?"
+            "    ORDER BY run_at LIMIT 1)"
+            "  ORDER BY run_at LIMIT ?)",
+            (claim, now, now, now, limit))
+        return [(row[0], row[1], json.loads(row[2]), row[3]) for row in conn.execute(
+            'SELECT id, name, args, attempts FROM job WHERE claim = ? ORDER BY id', (claim,))]
+
+    def requeue_stale(self, before, max_attempts):
+        """Queue again the jobs claimed before ``before`` and still running,
+        whose worker died; each expired lease counts as a failed attempt."""
+        return self.connect().execute(
+            "UPDATE job SET status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'queued' END, "
+            "claim = NULL, attempts = attempts + 1, run_at = ?, error = 'lease expired' "
+            "WHERE status = 'running' AND claimed_at < ?", (max_attempts, time(), before)).rowcount
+
+    def done(self, ids):
+        self.connect().executemany("UPDATE job SET status = 'done', claim = NULL WHERE id = ?",
+                                   [(id_,) for id_ in ids])
+
+    def retry(self, id_, attempts, delay, error):
+        self.connect().execute(
+            "UPDATE job SET status = 'queued', claim = NULL, attempts = ?, run_at = ?, error = ? "
+            "WHERE id = ?", (attempts, time() + delay, error, id_))
+
+    def fail(self, id_, attempts, error):
+        self.connect().execute(
+            "UPDATE job SET status = 'failed', claim = NULL, attempts = ?, error = ? WHERE id = ?",
+            (attempts, error, id_))
+
+    def depth(self):
+        return self.connect().execute(
+            "SELECT count(*) FROM job WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def counts(self):
+        return self.connect().execute(
+            'SELECT status, count(*) FROM job GROUP BY status ORDER BY status').fetchall()
+
+    def purge(self, before):
+        return self.connect().execute(
+            "DELETE FROM job WHERE status = 'done' AND created < ?", (before,)).rowcount
+
+
+class _QueueState(object):
+    def __init__(self, app):
+        self.app = app
+        self.store = None
+        self.workers = []
+        self.wakeup = threading.Event()
+        self.lock = threading.Lock()
+
+
+class JobQueue(object):
+    """Persistent background jobs run by a bounded pool of threads.
+
+    Jobs are rows of the SQLite database at ``JOBS_DATABASE``; each process
+    starts ``JOB_WORKERS`` threads the first time it enqueues a job (or
+    ``flask jobs work`` runs a dedicated worker). Failed jobs are retried
+    ``JOB_MAX_ATTEMPTS`` times with an exponential backoff. A job still
+    running ``JOB_LEASE_TIMEOUT`` seconds after it was claimed is assumed
+    lost with its worker and queued again. With ``JOBS_EAGER`` (the default
+    under testing) jobs run inline.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('JOBS_EAGER', app.testing)
+        app.config.setdefault('JOBS_DATABASE', 'jobs.db')
+        app.config.setdefault('JOB_WORKERS', 2)
+        app.config.setdefault('JOB_BATCH_SIZE', 20)
+        app.config.setdefault('JOB_MAX_ATTEMPTS', 5)
+        app.config.setdefault('JOB_RETRY_BACKOFF', 10)
+        app.config.setdefault('JOB_POLL_INTERVAL', 5)
+        app.config.setdefault('JOB_LEASE_TIMEOUT', 600)
+        app.extensions['jobs'] = _QueueState(app)
+
+    @property
+    def _state(self):
+        return current_app.extensions['jobs']
+
+    @property
+    def store(self):
+        state = self._state
+        if state.store is None:
+            with state.lock:
+                if state.store is None:
+                    state.store = JobStore(current_app.config['JOBS_DATABASE'])
+        return state.store
+
+    def enqueue(self, name, **kwargs):
+        f, batch = TASKS[name]
+        if current_app.config['JOBS_EAGER']:
+            return f([kwargs]) if batch else f(**kwargs)
+        job_id = self.store.push(name, kwargs)
+        self.start()
+        self._state.wakeup.set()
+        return job_id
+
+    def depth(self):
+        if current_app.config['JOBS_EAGER']:
+            return 0
+        return self.store.depth()
+
+    def start(self):
+        state = self._state
+        if state.workers:
+            return
+        store = self.store
+        with state.lock:
+            while len(state.workers) < current_app.config['JOB_WORKERS']:
+                worker = threading.Thread(target=self._work, args=(state, store), daemon=True)
+                worker.start()
+                state.workers.append(worker)
+
+    def run_pending(self, state=None, store=None):
+        """Run one batch of ready jobs, returns the number of jobs run."""
+        state = state or self._state
+        store = store or self.store
+        config = state.app.config
+        store.requeue_stale(time() - config['JOB_LEASE_TIMEOUT'], config['JOB_MAX_ATTEMPTS'])
+        jobs = store.claim(config['JOB_BATCH_SIZE'])
+        if not jobs:
+            return 0
+        name = jobs[0][1]
+        f, batch = TASKS[name]
+        calls = [jobs] if batch else [[job] for job in jobs]
+        for call in calls:
+            with state.app.app_context():
+                from app import db
+                try:
+                    if batch:
+                        errors = f([args for _, _, args, _ in call]) or [None] * len(call)
+                    else:
+                        f(**call[0][2])
+                        errors = [None]
+                except Exception as e:
+                    db.session.rollback()
+                    state.app.logger.exception('Job %s failed', name)
+                    errors = [e] * len(call)
+                finally:
+                    db.session.remove()
+            store.done([job[0] for job, error in zip(call, errors) if error is None])
+            for (id_, _, _, attempts), error in zip(call, errors):
+                if error is None:
+                    continue
+                if attempts + 1 >= config['JOB_MAX_ATTEMPTS']:
+                    store.fail(id_, attempts + 1, repr(error))
+                else:
+                    store.retry(id_, attempts + 1,
+                                config['JOB_RETRY_BACKOFF'] * 2 ** attempts, repr(error))
+        return len(jobs)
+
+    def _work(self, state, store):
+        while True:
+            try:
+                if self.run_pending(state, store):
+                    continue
+            except sqlite3.Error:
+                state.app.logger.exception('Job queue unavailable')
+            state.wakeup.wait(state.app.config['JOB_POLL_INTERVAL'])
+            state.wakeup.clear()
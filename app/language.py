@@ -0,0 +1,58 @@
+from functools import lru_cache
+from app.jobs import task
+
+_guess_language = None
+
+
+def _guesser():
+    # the trigram models are only loaded the first time a post is detected
+    global _guess_language
+    if _guess_language is None:
+        from guess_language import guess_language
+        _guess_language = guess_language
+    return _guess_language
+
+
+@lru_cache(maxsize=4096)
+def detect_language(text):
+    language = _guesser()(text)
+    if language == 'UNKNOWN' or len(language) > 5:
+        language = ''
+    return language
+
+
+def store_languages(languages):
+    from app import db
+    from app.models import Post
+    db.session.bulk_update_mappings(Post, [{'id': post_id, 'language': language}
+                                           for post_id, language in languages.items()])
+    db.session.commit()
+
+
+@task('detect_languages', batch=True)
+def detect_post_languages(posts):
+    store_languages({post['post_id']: detect_language(post['body']) for post in posts})
+
+
+def submit_post(post):
+    """Queue the language detection of a post saved with ``language`` None.
+
+    The job queue groups the pending ``detect_languages`` jobs, so one
+    worker writes a whole batch back in a single update.
+    """
+    from app import jobs
+    jobs.enqueue('detect_languages', post_id=post.id, body=post.body)
+
+
+def backfill_languages(batch_size=500):
+    from app.models import Post
+    done = 0
+    last_id = 0
+    while True:
+        posts = Post.query.with_entities(Post.id, Post.body).filter(
+            Post.language.is_(None), Post.id > last_id).order_by(Post.id).limit(batch_size).all()
+        if not posts:
+            return done
+        store_languages({post.id: detect_language(post.body or '') for post in posts})
+        done += len(posts)
+        last_id = posts[-1].id
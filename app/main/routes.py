@@ -1,15 +1,19 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
-from datetime import datetime
 from flask import render_template, flash, redirect, url_for, request, g, \
-    jsonify, current_app
+    jsonify, current_app, abort
 from flask_login import current_user, login_required
+from sqlalchemy.exc import IntegrityError
 from flask_babel import _, get_locale
-from guess_language import guess_language
-from app import db
-from app.main.forms import EditProfileForm, PostForm, NewGameForm, EditUserForm
-from app.models import User, Post, Grape, AOC, Game, get_player_stats
-from app.translate import translate
+from app import db, catalog, presence, styles, metrics
+from app.main.forms import EditProfileForm, PostForm, NewGameForm, EditUserForm, SearchForm
+from app.models import User, Post, Grape, AOC, Game, PlayerStats, LeaderboardEntry, \
+    TimelineEntry, get_player_stats, get_players_stats
+from app.caching import reference_page
+from app.language import submit_post
+from app.pagination import cursor_paginate, paginate_sorted
+from app.quiz import SignedRound
+from app.translate import translate, translate_posts, TranslationError
 from app.main import bp
 import random
 
@@ -17,8 +21,8 @@ import random
 @bp.before_app_request
 def before_request():
     if current_user.is_authenticated:
-        current_user.last_seen = datetime.utcnow()
-        db.session.commit()
+        presence.touch(current_user)
+        g.search_form = SearchForm()
     g.locale = str(get_locale())
 
 
@@ -28,21 +32,20 @@ def before_request():
 def index():
     form = PostForm()
     if form.validate_on_submit():
-        language = guess_language(form.post.data)
-        if language == 'UNKNOWN' or len(language) > 5:
-            language = ''
-        post = Post(body=form.post.data, author=current_user,
-                    language=language)
+        post = Post(body=form.post.data, author=current_user)
         db.session.add(post)
         db.session.commit()
+        submit_post(post)
         flash(_('Your post is now live!'))
         return redirect(url_for('main.index'))
-    page = request.args.get('page', 1, type=int)
-    posts = current_user.followed_posts().paginate(
-        page, current_app.config['POSTS_PER_PAGE'], False)
-    next_url = url_for('main.index', page=posts.next_num) \
+    posts = cursor_paginate(current_user.timeline().options(db.joinedload(Post.author)),
+                            [TimelineEntry.timestamp, TimelineEntry.post_id],
+                            request.args.get('cursor'),
+                            current_app.config['POSTS_PER_PAGE'],
+                            key=lambda post: (post.timestamp, post.id))
+    next_url = url_for('main.index', cursor=posts.next_cursor) \
         if posts.has_next else None
-    prev_url = url_for('main.index', page=posts.prev_num) \
+    prev_url = url_for('main.index', cursor=posts.prev_cursor) \
         if posts.has_prev else None
     return render_template('index.html', title=_('Home'), form=form,
                            posts=posts.items, next_url=next_url,
@@ -60,36 +63,65 @@ def explore():
     return render_template('explore.html')
 
 
+@bp.route('/search')
+@login_required
+def search():
+    if not g.search_form.validate():
+        return redirect(url_for('main.explore'))
+    q = g.search_form.q.data
+    return render_template('search.html', title=_('Search'),
+                           grapes=Grape.search(q),
+                           aocs=AOC.search(q),
+                           posts=Post.search(q, options=[db.joinedload(Post.author)]))
+
+
+@bp.route('/api/suggest')
+@login_required
+def suggest():
+    limit = min(request.args.get('limit', current_app.config['SUGGEST_SIZE'], type=int),
+                current_app.config['SUGGEST_SIZE'])
+    suggestions = []
+    for kind, id_, name in catalog.data.suggest(request.args.get('q', ''), limit):
+        if kind == 'grape':
+            url = url_for('main.grape_identity_card', grape_id=id_)
+        else:
+            url = url_for('main.aoc_identity_card', aoc_id=id_)
+        suggestions.append({'kind': kind, 'id': id_, 'name': name, 'url': url})
+    return jsonify({'suggestions': suggestions})
+
+
 @bp.route('/explore_grapes')
 @login_required
+@reference_page
 def explore_grapes():
-    page = request.args.get('page', 1, type=int)
-    grapes = Grape.query.order_by(Grape.id.asc()).paginate(
-        page, current_app.config['GRAPES_PER_PAGE'], False)
-    next_url = url_for('main.explore_grapes', page=grapes.next_num) \
+    reference = catalog.data
+    grapes = paginate_sorted(reference.grape_ids, request.args.get('cursor'),
+                             current_app.config['GRAPES_PER_PAGE'])
+    next_url = url_for('main.explore_grapes', cursor=grapes.next_cursor) \
         if grapes.has_next else None
-    prev_url = url_for('main.explore_grapes', page=grapes.prev_num) \
+    prev_url = url_for('main.explore_grapes', cursor=grapes.prev_cursor) \
         if grapes.has_prev else None
     return render_template('explore_grapes.html',
                            title=_('Explore Grapes'),
-                           grapes=grapes.items,
+                           grapes=[reference.grapes[id_] for id_ in grapes.items],
                            next_url=next_url,
                            prev_url=prev_url)
 
 
 @bp.route('/explore_aocs')
 @login_required
+@reference_page
 def explore_aocs():
-    page = request.args.get('page', 1, type=int)
-    aocs = AOC.query.order_by(AOC.id.asc()).paginate(
-        page, current_app.config['AOC_PER_PAGE'], False)
-    next_url = url_for('main.explore_aocs', page=aocs.next_num) \
+    reference = catalog.data
+    aocs = paginate_sorted(reference.aoc_ids, request.args.get('cursor'),
+                           current_app.config['AOC_PER_PAGE'])
+    next_url = url_for('main.explore_aocs', cursor=aocs.next_cursor) \
         if aocs.has_next else None
-    prev_url = url_for('main.explore_aocs', page=aocs.prev_num) \
+    prev_url = url_for('main.explore_aocs', cursor=aocs.prev_cursor) \
         if aocs.has_prev else None
     return render_template('explore_aocs.html',
                            title=_('Explore AOCs'),
-                           aocs=aocs.items,
+                           aocs=[reference.aocs[id_] for id_ in aocs.items],
                            next_url=next_url,
                            prev_url=prev_url)
 
@@ -102,13 +134,12 @@ def user(username):
 
     summary_per_type, nb_played_games = get_player_stats(user_)
 
-    page = request.args.get('page', 1, type=int)
-    posts = user_.posts.order_by(Post.timestamp.desc()).paginate(
-        page, current_app.config['POSTS_PER_PAGE'], False)
+    posts = cursor_paginate(user_.posts, [Post.timestamp, Post.id], request.args.get('cursor'),
+                            current_app.config['POSTS_PER_PAGE'])
     next_url = url_for('main.user', username=user_.username,
-                       page=posts.next_num) if posts.has_next else None
+                       cursor=posts.next_cursor) if posts.has_next else None
     prev_url = url_for('main.user', username=user_.username,
-                       page=posts.prev_num) if posts.has_prev else None
+                       cursor=posts.prev_cursor) if posts.has_prev else None
     return render_template('user.html', user=user_, posts=posts.items,
                            next_url=next_url, prev_url=prev_url, nb_played_games=nb_played_games,
                            games_data=summary_per_type)
@@ -173,6 +204,25 @@ def translate_text():
                                       request.form['dest_language'])})
 
 
+@bp.route('/translate_batch', methods=['POST'])
+@login_required
+def translate_batch():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('dest_language'), str) or \
+            not isinstance(data.get('posts', []), list):
+        abort(400)
+    posts = {}
+    for item in data.get('posts', []):
+        if not isinstance(item, dict) or 'id' not in item or not isinstance(item.get('text'), str):
+            abort(400)
+        posts[str(item['id'])] = (item['text'], item.get('source_language'))
+    try:
+        translations = translate_posts(posts, data['dest_language'])
+    except TranslationError as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({'translations': translations})
+
+
 @bp.route('/new_game', methods=['GET', 'POST'])
 @login_required
 def new_game():
@@ -188,15 +238,36 @@ def new_game():
     return render_template('new_game.html', title=_('Launch a new game!'), form=form)
 
 
-def right_answer(game):
+def load_game(game_id, game_type, question_id):
+    if not current_app.config['QUIZ_SIGNED_ROUNDS']:
+        return Game.query.filter_by(id=game_id).first_or_404()
+    game = SignedRound.verify_token(game_id)
+    if game is None or game.player_id != current_user.id or \
+            game.game_type != game_type or game.question_id != question_id:
+        abort(404)
+    return game
+
+
+def right_answer(game, next_question_id):
     flash(_('Right answer'))
+    metrics.inc('quiz_answers_total', game_type=game.game_type, result='right')
     game.increment_score()
+    if isinstance(game, SignedRound):
+        # the new state travels in the next url, nothing to write
+        game.question_id = next_question_id
+        return
     db.session.add(game)
     db.session.commit()
 
 
 def wrong_answer(game):
     flash(_('Wrong answer'))
+    metrics.inc('quiz_answers_total', game_type=game.game_type, result='wrong')
+    if isinstance(game, SignedRound):
+        if Game.query.filter_by(token=game.nonce).first() is not None:
+            # a replayed signed round whose result is already recorded
+            return
+        game = game.to_game()
     game.is_over = True
     db.session.add(game)
     post = Post(
@@ -205,51 +276,63 @@ def wrong_answer(game):
         author=current_user,
         language='en')
     db.session.add(post)
-    db.session.commit()
+    token = game.token
+    try:
+        PlayerStats.record(game)
+        LeaderboardEntry.record(game)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        # the same signed round replayed concurrently, the other request recorded it
+        if token is None or Game.query.filter_by(token=token).first() is None:
+            raise
+        return
+    metrics.inc('games_finished_total', game_type=game.game_type)
 
 
 @bp.route('/quick_new_game/<game_type>')
 @login_required
 def quick_new_game(game_type):
     game_name = current_app.config['GAMES_TO_NAMES'][game_type]
-    new_game_ = Game(player_id=current_user.id, game_type=game_type)
-    db.session.add(new_game_)
-    db.session.commit()
+    question = catalog.data.pools[game_type].draw()
+    if current_app.config['QUIZ_SIGNED_ROUNDS']:
+        new_game_ = SignedRound(current_user.id, game_type, question.id)
+    else:
+        new_game_ = Game(player_id=current_user.id, game_type=game_type)
+        db.session.add(new_game_)
+        db.session.commit()
+    metrics.inc('games_started_total', game_type=game_type)
     flash(_('New game of {}'.format(game_name)))
     if 'grape' in game_type:
-        grape_ids = Grape.query.with_entities(Grape.id).all()
-        random_grape_id = random.choices(grape_ids)[0]
-        print(random_grape_id)
-        print('lol')
-        return redirect(url_for('main.{}'.format(game_type), grape_id=random_grape_id[0], game_id=new_game_.id))
+        return redirect(url_for('main.{}'.format(game_type), grape_id=question.id,
+                                game_id=new_game_.id))
     elif 'aoc' in game_type:
-        aoc_ids = AOC.query.with_entities(AOC.id).all()
-        random_aoc_id = random.choices(aoc_ids)[0]
-        return redirect(url_for('main.{}'.format(game_type), aoc_id=random_aoc_id[0], game_id=new_game_.id))
+        return redirect(url_for('main.{}'.format(game_type), aoc_id=question.id,
+                                game_id=new_game_.id))
     return redirect('main.new_game')
 
 
-@bp.route('/quiz_grape_color/<game_id>/<grape_id>', methods=['GET', 'POST'])
+@bp.route('/quiz_grape_color/<game_id>/<int:grape_id>', methods=['GET', 'POST'])
 @login_required
 def quiz_grape_color(game_id, grape_id):
     # getting the game
-    current_game = Game.query.filter_by(id=game_id).first_or_404()
+    current_game = load_game(game_id, 'quiz_grape_color', grape_id)
     if current_game.is_over:
         return redirect(url_for('main.new_game'))
 
     # getting the grape
-    random_grape = Grape.query.filter_by(id=grape_id).first_or_404()
-    true_red = random_grape.red
-    grape_name = random_grape.name
-    grape_id = random_grape.id
+    pool = catalog.data.pools['quiz_grape_color']
+    question = pool.get_or_404(grape_id)
+    true_red = question.red
+    grape_name = question.name
 
     if request.method == 'POST':
         if request.form['submit-button'] == 'Red':
             if true_red:
-                right_answer(current_game)
-                grape_ids = Grape.query.with_entities(Grape.id).all()
+                next_id = pool.draw().id
+                right_answer(current_game, next_id)
                 return redirect(url_for('main.quiz_grape_color',
-                                        grape_id=random.choice(grape_ids)[0],
+                                        grape_id=next_id,
                                         game_id=current_game.id))
             else:
                 wrong_answer(current_game)
@@ -258,10 +341,10 @@ def quiz_grape_color(game_id, grape_id):
         elif request.form['submit-button'] == 'White':
 
             if not true_red:
-                right_answer(current_game)
-                grape_ids = Grape.query.with_entities(Grape.id).all()
+                next_id = pool.draw().id
+                right_answer(current_game, next_id)
                 return redirect(url_for('main.quiz_grape_color',
-                                        grape_id=random.choice(grape_ids)[0],
+                                        grape_id=next_id,
                                         game_id=current_game.id))
             else:
                 wrong_answer(current_game)
@@ -271,15 +354,15 @@ def quiz_grape_color(game_id, grape_id):
         return render_template('red_or_white.html', title='Grape - Color Quiz', grape_name=grape_name)
 
 
-@bp.route('/grape_identity_card/<grape_id>', methods=['GET', 'POST'])
+@bp.route('/grape_identity_card/<int:grape_id>', methods=['GET', 'POST'])
 @login_required
+@reference_page
 def grape_identity_card(grape_id):
-    grape = Grape.query.filter_by(id=grape_id).first_or_404()
-    max_id = Grape.query.order_by(Grape.id.desc()).first().id
-    min_id = Grape.query.order_by(Grape.id.asc()).first().id
-    grape_id_num = int(grape_id)
-    next_url = None if max_id == grape_id_num else url_for('main.grape_identity_card', grape_id=grape_id_num + 1)
-    prev_url = None if min_id == grape_id_num else url_for('main.grape_identity_card', grape_id=grape_id_num - 1)
+    reference = catalog.data
+    grape = reference.grape_or_404(grape_id)
+    prev_id, next_id = reference.grape_neighbors(grape_id)
+    next_url = None if next_id is None else url_for('main.grape_identity_card', grape_id=next_id)
+    prev_url = None if prev_id is None else url_for('main.grape_identity_card', grape_id=prev_id)
 
     true_red = grape.red
     grape_name = grape.name
@@ -299,21 +382,21 @@ def grape_identity_card(grape_id):
                            next_url=next_url)
 
 
-@bp.route('/aoc_identity_card/<aoc_id>', methods=['GET', 'POST'])
+@bp.route('/aoc_identity_card/<int:aoc_id>', methods=['GET', 'POST'])
 @login_required
+@reference_page
 def aoc_identity_card(aoc_id):
-    aoc = AOC.query.filter_by(id=aoc_id).first_or_404()
+    reference = catalog.data
+    aoc = reference.aoc_or_404(aoc_id)
     aoc_name = aoc.name
     aoc_vineyard = aoc.vineyard
 
-    red = aoc.still_red_wineor or aoc.sparkly_red_wine
-    white = aoc.still_white_wine or aoc.sparkly_white_wine
+    red = bool(aoc.style & styles.RED)
+    white = bool(aoc.style & styles.WHITE)
 
-    max_id = AOC.query.order_by(AOC.id.desc()).first().id
-    min_id = AOC.query.order_by(AOC.id.asc()).first().id
-    aoc_id_num = int(aoc_id)
-    next_url = None if max_id == aoc_id_num else url_for('main.aoc_identity_card', aoc_id=aoc_id_num + 1)
-    prev_url = None if min_id == aoc_id_num else url_for('main.aoc_identity_card', aoc_id=aoc_id_num - 1)
+    prev_id, next_id = reference.aoc_neighbors(aoc_id)
+    next_url = None if next_id is None else url_for('main.aoc_identity_card', aoc_id=next_id)
+    prev_url = None if prev_id is None else url_for('main.aoc_identity_card', aoc_id=prev_id)
 
     return render_template('aoc_identity_card.html',
                            red=red,
@@ -325,57 +408,35 @@ def aoc_identity_card(aoc_id):
                            next_url=next_url)
 
 
-def clean_vineyard(vineyard):
-    return vineyard.lower().replace(u'ô', 'o'). \
-        replace(u'val de ', '').replace(u'lorraine', 'champagne'). \
-        replace(u'vallée du ', '').replace(u'-roussillon', ''). \
-        replace(u'-bugey', '').replace(u'lyonnais', 'rhone'). \
-        replace(u'beaujolais', 'bourgogne').replace(u'limousin', 'sud-ouest'). \
-        replace(u'charentes', 'bordeaux').replace(u' ', '')
+def pick_vineyards(question):
+    positive_vineyard = random.choice(question.positive_vineyards)
+    negative_vineyard = random.choice(question.negative_vineyards)
+    left_vineyard, right_vineyard = random.sample([positive_vineyard, negative_vineyard], k=2)
+    return positive_vineyard, left_vineyard, right_vineyard
 
 
-@bp.route('/quiz_grape_region/<game_id>/<grape_id>', methods=['GET', 'POST'])
+@bp.route('/quiz_grape_region/<game_id>/<int:grape_id>', methods=['GET', 'POST'])
 @login_required
 def quiz_grape_region(game_id, grape_id):
     # getting the game
-    current_game = Game.query.filter_by(id=game_id).first_or_404()
+    current_game = load_game(game_id, 'quiz_grape_region', grape_id)
     if current_game.is_over:
         return redirect(url_for('main.new_game'))
 
-    grape = Grape.query.filter_by(id=grape_id).first_or_404()
-    grape_name = grape.name
-    clean_vineyards = clean_vineyard(grape.vineyards)
-    list_of_vineyards = current_app.config['VINEYARDS']
-
-    list_of_positive_vineyards = []
-    list_of_negative_vineyards = []
-
-    for vineyard in list_of_vineyards:
-        if vineyard in clean_vineyards:
-            list_of_positive_vineyards.append(vineyard)
-        else:
-            list_of_negative_vineyards.append(vineyard)
-
-    # si les informations ne sont pas présentes on change de cépage
-    if len(list_of_positive_vineyards) == 0 or len(list_of_negative_vineyards) == 0:
-        grape_ids = Grape.query.with_entities(Grape.id).all()
-        return redirect(url_for('main.quiz_grape_region',
-                                grape_id=random.choice(grape_ids)[0],
-                                game_id=current_game.id))
-    else:
-        positive_vineyard = random.choice(list_of_positive_vineyards)
-        negative_vineyard = random.choice(list_of_negative_vineyards)
-
-        left_vineyard, right_vineyard = random.sample([positive_vineyard, negative_vineyard], k=2)
+    # only grapes with known and unknown vineyards are in the pool
+    pool = catalog.data.pools['quiz_grape_region']
+    question = pool.get_or_404(grape_id)
+    grape_name = question.name
+    positive_vineyard, left_vineyard, right_vineyard = pick_vineyards(question)
 
     if request.method == 'POST':
         clicked_is_positive = next(request.form.keys()).replace('.x', '')
 
         if clicked_is_positive == 'True':
-            right_answer(current_game)
-            grape_ids = Grape.query.with_entities(Grape.id).all()
+            next_id = pool.draw().id
+            right_answer(current_game, next_id)
             return redirect(url_for('main.quiz_grape_region',
-                                    grape_id=random.choice(grape_ids)[0],
+                                    grape_id=next_id,
                                     game_id=current_game.id))
         else:
             wrong_answer(current_game)
@@ -390,33 +451,26 @@ def quiz_grape_region(game_id, grape_id):
                                title='Grape - Region Quiz')
 
 
-@bp.route('/quiz_aoc_region/<game_id>/<aoc_id>', methods=['GET', 'POST'])
+@bp.route('/quiz_aoc_region/<game_id>/<int:aoc_id>', methods=['GET', 'POST'])
 @login_required
 def quiz_aoc_region(game_id, aoc_id):
     # getting the game
-    current_game = Game.query.filter_by(id=game_id).first_or_404()
+    current_game = load_game(game_id, 'quiz_aoc_region', aoc_id)
     if current_game.is_over:
         return redirect(url_for('main.new_game'))
 
-    aoc = AOC.query.filter_by(id=aoc_id).first_or_404()
-    aoc_name = aoc.name.split(' ou')[0]
-    aoc_vineyard = aoc.vineyard
-
-    list_of_vineyards = current_app.config['VINEYARDS']
-
-    positive_vineyard = clean_vineyard(aoc_vineyard)
-
-    list_of_vineyards.remove(positive_vineyard)
-    negative_vineyard = random.choice(list_of_vineyards)
-    left_vineyard, right_vineyard = random.sample([positive_vineyard, negative_vineyard], k=2)
+    pool = catalog.data.pools['quiz_aoc_region']
+    question = pool.get_or_404(aoc_id)
+    aoc_name = question.name
+    positive_vineyard, left_vineyard, right_vineyard = pick_vineyards(question)
 
     if request.method == 'POST':
         clicked_is_positive = next(request.form.keys()).replace(u'.x', '')
         if clicked_is_positive == 'True':
-            aoc_ids = AOC.query.with_entities(AOC.id).all()
-            right_answer(current_game)
+            next_id = pool.draw().id
+            right_answer(current_game, next_id)
             return redirect(url_for('main.quiz_aoc_region',
-                                    aoc_id=random.choice(aoc_ids)[0],
+                                    aoc_id=next_id,
                                     game_id=current_game.id))
         else:
             wrong_answer(current_game)
@@ -431,28 +485,28 @@ def quiz_aoc_region(game_id, aoc_id):
                            title='AOC - Region Quiz')
 
 
-@bp.route('/quiz_aoc_color/<game_id>/<aoc_id>', methods=['GET', 'POST'])
+@bp.route('/quiz_aoc_color/<game_id>/<int:aoc_id>', methods=['GET', 'POST'])
 @login_required
 def quiz_aoc_color(game_id, aoc_id):
     # getting the game
-    current_game = Game.query.filter_by(id=game_id).first_or_404()
+    current_game = load_game(game_id, 'quiz_aoc_color', aoc_id)
     if current_game.is_over:
         return redirect(url_for('main.new_game'))
 
-    # getting the grape
-    random_aoc = AOC.query.filter_by(id=aoc_id).first_or_404()
-    red = random_aoc.still_red_wine or random_aoc.sparkly_red_wine
-    white = random_aoc.stil_white_wine or random_aoc.sparkly_white_wine or \
-            random_aoc.still_rose_wine or random_aoc.sparkly_rose_wine
-    aoc_name = random_aoc.name
+    # getting the aoc
+    pool = catalog.data.pools['quiz_aoc_color']
+    question = pool.get_or_404(aoc_id)
+    red = question.red
+    white = question.white
+    aoc_name = question.name
 
     if request.method == 'POST':
         if request.form['submit-button'] == 'Red':
             if red:
-                right_answer(current_game)
-                aoc_ids = AOC.query.with_entities(AOC.id).all()
+                next_id = pool.draw().id
+                right_answer(current_game, next_id)
                 return redirect(url_for('main.quiz_aoc_color',
-                                        aoc_id=random.choice(aoc_ids)[0],
+                                        aoc_id=next_id,
                                         game_id=current_game.id))
             else:
                 wrong_answer(current_game)
@@ -461,10 +515,10 @@ def quiz_aoc_color(game_id, aoc_id):
         elif request.form['submit-button'] == 'White':
 
             if white:
-                right_answer(current_game)
-                aoc_ids = AOC.query.with_entities(AOC.id).all()
+                next_id = pool.draw().id
+                right_answer(current_game, next_id)
                 return redirect(url_for('main.quiz_aoc_color',
-                                        aoc_id=random.choice(aoc_ids)[0],
+                                        aoc_id=next_id,
                                         game_id=current_game.id))
             else:
                 wrong_answer(current_game)
@@ -477,18 +531,31 @@ def quiz_aoc_color(game_id, aoc_id):
                                grape_name=aoc_name)
 
 
+@bp.route('/leaderboard')
+@bp.route('/leaderboard/<game_type>')
+@login_required
+def leaderboard(game_type='all'):
+    if game_type != 'all' and game_type not in current_app.config['GAMES_TO_NAMES']:
+        abort(404)
+    weekly = request.args.get('period') == 'week'
+    entries = LeaderboardEntry.top(game_type,
+                                   days=current_app.config['LEADERBOARD_WINDOW'] if weekly else None)
+    return render_template('leaderboard.html', title=_('Leaderboard'),
+                           entries=entries, game_type=game_type, weekly=weekly,
+                           games=current_app.config['GAMES_TO_NAMES'])
+
+
 @bp.route('/explore_users', methods=['GET', 'POST'])
 @login_required
 def explore_users():
-    page = request.args.get('page', 1, type=int)
-    users = User.query.order_by(User.id.asc()).paginate(
-        page, current_app.config['USERS_PER_PAGE'], False)
-    next_url = url_for('main.explore_users', page=users.next_num) \
+    users = cursor_paginate(User.query, [User.id], request.args.get('cursor'),
+                            current_app.config['USERS_PER_PAGE'], descending=False)
+    next_url = url_for('main.explore_users', cursor=users.next_cursor) \
         if users.has_next else None
-    prev_url = url_for('main.explore_users', page=users.prev_num) \
+    prev_url = url_for('main.explore_users', cursor=users.prev_cursor) \
         if users.has_prev else None
 
-    games_stats = {u.id: get_player_stats(u) for u in users.items}
+    games_stats = get_players_stats(users.items)
 
     return render_template('explore_users.html',
                            users=users.items,
@@ -504,6 +571,9 @@ def delete_user(username):
         return redirect(url_for('main.index'))
     else:
         user_to_delete = User.query.filter_by(username=username).first_or_404()
+        LeaderboardEntry.query.filter_by(player_id=user_to_delete.id).delete()
+        PlayerStats.query.filter_by(player_id=user_to_delete.id).delete()
+        TimelineEntry.remove_user(user_to_delete)
         db.session.delete(user_to_delete)
         db.session.commit()
         flash(_('User {} deleted'.format(username)))
@@ -553,12 +623,12 @@ def edit_user(username):
 def explore_posts():
     if current_user.username != 'admin':
         return redirect(url_for('main.index'))
-    page = request.args.get('page', 1, type=int)
-    posts = Post.query.order_by(Post.timestamp.desc()).paginate(
-        page, current_app.config['POSTS_PER_PAGE'], False)
+    posts = cursor_paginate(Post.query.options(db.joinedload(Post.author)),
+                            [Post.timestamp, Post.id], request.args.get('cursor'),
+                            current_app.config['POSTS_PER_PAGE'])
     next_url = url_for('main.explore_posts',
-                       page=posts.next_num) if posts.has_next else None
+                       cursor=posts.next_cursor) if posts.has_next else None
     prev_url = url_for('main.explore_posts',
-                       page=posts.prev_num) if posts.has_prev else None
+                       cursor=posts.prev_cursor) if posts.has_prev else None
     return render_template('explore_posts.html', posts=posts.items,
                            next_url=next_url, prev_url=prev_url)
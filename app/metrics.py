@@ -0,0 +1,324 @@
+import atexit
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from time import perf_counter, time
+from flask import current_app, request, g, abort
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _format_le(bound):
+    return '+Inf' if bound == float('inf') else _format_value(bound)
+
+
+class Registry(object):
+    """Counters, gauges and histograms of one process.
+
+    The values are flat samples keyed by ``(metric, suffix, labels)``;
+    a histogram observation bumps its ``_bucket``, ``_sum`` and ``_count``
+    samples, so the samples of several processes merge by addition.
+
+    A metric declared with ``collect`` takes its values from that function
+    of the app when the registry is read; with ``shared`` it measures
+    something all the processes see (the database, the job queue), so it
+    is only read by the process answering the scrape and never summed.
+    """
+
+    def __init__(self):
+        self.metrics = OrderedDict()
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def declare(self, name, kind, help_, buckets=None, collect=None, shared=False):
+        if kind == 'histogram':
+            buckets = tuple(sorted(buckets or DEFAULT_BUCKETS)) + (float('inf'),)
+        self.metrics[name] = {'kind': kind, 'help': help_, 'buckets': buckets,
+                              'collect': collect, 'shared': shared}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, '', _labels(labels))
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.samples[(name, '', _labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        labels = _labels(labels)
+        with self.lock:
+            for bound in self.metrics[name]['buckets']:
+                if value <= bound:
+                    key = (name, '_bucket', labels + (('le', _format_le(bound)),))
+                    self.samples[key] = self.samples.get(key, 0) + 1
+            for suffix, amount in (('_sum', value), ('_count', 1)):
+                key = (name, suffix, labels)
+                self.samples[key] = self.samples.get(key, 0) + amount
+
+    def collect(self, app, shared=False):
+        """Run the ``collect`` functions and return the samples."""
+        for name, metric in self.metrics.items():
+            if metric['collect'] is not None and metric['shared'] == shared:
+                values = metric['collect'](app)
+                with self.lock:
+                    for key in [key for key in self.samples if key[0] == name]:
+                        del self.samples[key]
+                    for labels, value in values:
+                        self.samples[(name, '', _labels(labels))] = value
+        with self.lock:
+            return [key + (value,) for key, value in self.samples.items()
+                    if self.metrics[key[0]]['shared'] == shared]
+
+    def render(self, samples):
+        """Prometheus text exposition format (version 0.0.4)."""
+        by_metric = {}
+        for name, suffix, labels, value in samples:
+            by_metric.setdefault(name, []).append((suffix, labels, value))
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append('# HELP {} {}'.format(name, metric['help']))
+            lines.append('# TYPE {} {}'.format(name, metric['kind']))
+            for suffix, labels, value in sorted(by_metric.get(name, []), key=_sort_key):
+                label_text = ','.join('{}="{}"'.format(k, str(v).replace('\\', r'\\')
+                                                           .replace('"', r'\"'))
+                                      for k, v in labels)
+                lines.append('{}{}{} {}'.format(name, suffix,
+                                                '{' + label_text + '}' if label_text else '',
+                                                _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _sort_key(sample):
+    suffix, labels, value = sample
+    le = dict(labels).get('le')
+    # buckets in increasing order, before _count and _sum of the same labels
+    return ([label for label in labels if label[0] != 'le'], suffix,
+            float(le) if le is not None else 0)
+
+
+class ProcessFiles(object):
+    """One JSON file of samples per worker process in ``directory``.
+
+    Counters and histograms of the workers that exited stay in the sum,
+    as Prometheus expects totals that never go down; gauges only count
+    for the live workers. The file of an exited worker is renamed by
+    :meth:`retire`, so a new worker reusing its pid does not overwrite it.
+    Empty the directory when the server (not a worker) restarts, with
+    ``flask metrics clean``.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def write(self, samples, pid=None):
+        pid = pid or os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, '{}.json'.format(pid))
+        with open(path + '.tmp', 'w') as f:
+            json.dump([[name, suffix, labels, value] for name, suffix, labels, value in samples],
+                      f)
+        os.replace(path + '.tmp', path)
+
+    def retire(self, pid):
+        """Keep the samples of the exited process ``pid`` under another name."""
+        path = os.path.join(self.directory, '{}.json'.format(pid))
+        try:
+            os.replace(path, os.path.join(self.directory, 'retired-{}-{}.json'.format(
+                pid, uuid.uuid4().hex)))
+        except FileNotFoundError:
+            pass
+
+    def read(self, kinds):
+        merged = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            alive = filename[:-5].isdigit() and _alive(int(filename[:-5]))
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    samples = json.load(f)
+            except (IOError, ValueError):
+                continue
+            for name, suffix, labels, value in samples:
+                if name not in kinds or (kinds[name] == 'gauge' and not alive):
+                    continue
+                key = (name, suffix, tuple(tuple(label) for label in labels))
+                merged[key] = merged.get(key, 0) + value
+        return [key + (value,) for key, value in merged.items()]
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Metrics(object):
+    """Application metrics on ``/metrics``, in the Prometheus text format.
+
+    Every request is timed into a latency histogram per endpoint, and the
+    rest of the application counts what it does with :meth:`inc`,
+    :meth:`set` and :meth:`observe`. Under gunicorn, set ``METRICS_DIR`` to
+    a directory shared by the workers: each one writes its samples there at
+    most every ``METRICS_FLUSH_INTERVAL`` seconds (and when answering a
+    scrape) and the scrape adds up the files, so the figures do not depend
+    on the worker that happens to answer. The ``child_exit`` hook of
+    ``gunicorn.conf.py`` retires the files of the workers that exit.
+
+    ``/metrics`` requires ``METRICS_TOKEN`` as a bearer token when it is
+    set, otherwise it only answers the addresses in
+    ``METRICS_ALLOWED_IPS`` (the local host by default).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 5)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+        app.config.setdefault('METRICS_ACTIVE_WINDOW', 900)
+        registry = Registry()
+        app.extensions['metrics'] = {'registry': registry, 'flushed_at': 0}
+        self.declare(registry)
+        app.before_request(self.start_request)
+        app.after_request(self.end_request)
+        app.add_url_rule('/metrics', 'metrics', metrics_view)
+        if app.config['METRICS_DIR']:
+            atexit.register(self.flush, app)
+
+    @staticmethod
+    def declare(registry):
+        registry.declare('http_request_duration_seconds', 'histogram',
+                         'Request latency by endpoint.')
+        registry.declare('db_queries_total', 'counter', 'SQL statements run, by endpoint.')
+        registry.declare('db_query_seconds_total', 'counter',
+                         'Time spent in SQL statements, by endpoint.')
+        registry.declare('db_slow_queries_total', 'counter',
+                         'SQL statements over the slow query threshold.')
+        registry.declare('games_started_total', 'counter', 'Games started by game type.')
+        registry.declare('games_finished_total', 'counter', 'Games finished by game type.')
+        registry.declare('quiz_answers_total', 'counter',
+                         'Quiz answers by game type and result.')
+        registry.declare('cache_requests_total', 'counter',
+                         'In-process cache lookups by cache and result.',
+                         collect=cache_requests)
+        registry.declare('active_users', 'gauge',
+                         'Users seen within METRICS_ACTIVE_WINDOW seconds.',
+                         collect=active_users, shared=True)
+        registry.declare('job_queue_depth', 'gauge', 'Background jobs by status.',
+                         collect=queue_depth, shared=True)
+
+    @property
+    def _registry(self):
+        return current_app.extensions['metrics']['registry']
+
+    def inc(self, name, value=1, **labels):
+        self._registry.inc(name, value, **labels)
+
+    def set(self, name, value, **labels):
+        self._registry.set(name, value, **labels)
+
+    def observe(self, name, value, **labels):
+        self._registry.observe(name, value, **labels)
+
+    @staticmethod
+    def start_request():
+        g.metrics_start = perf_counter()
+
+    @staticmethod
+    def end_request(response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        state = current_app.extensions['metrics']
+        state['registry'].observe('http_request_duration_seconds', perf_counter() - start,
+                                  endpoint=request.endpoint or '-',
+                                  status=str(response.status_code))
+        if current_app.config['METRICS_DIR'] and \
+                time() - state['flushed_at'] >= current_app.config['METRICS_FLUSH_INTERVAL']:
+            Metrics.flush(current_app._get_current_object())
+        return response
+
+    @staticmethod
+    def flush(app):
+        state = app.extensions['metrics']
+        files = ProcessFiles(app.config['METRICS_DIR'])
+        if not state['flushed_at']:
+            # left by an exited process that had the same pid
+            files.retire(os.getpid())
+        state['flushed_at'] = time()
+        files.write(state['registry'].collect(app))
+
+    @staticmethod
+    def clean(app):
+        directory = app.config['METRICS_DIR']
+        if directory and os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+
+    @staticmethod
+    def samples(app):
+        registry = app.extensions['metrics']['registry']
+        if app.config['METRICS_DIR']:
+            Metrics.flush(app)
+            kinds = {name: metric['kind'] for name, metric in registry.metrics.items()}
+            samples = ProcessFiles(app.config['METRICS_DIR']).read(kinds)
+        else:
+            samples = registry.collect(app)
+        return samples + registry.collect(app, shared=True)
+
+
+def cache_requests(app):
+    caches = (('fragments', app.extensions['response_cache']['fragments']),
+              ('translations', app.extensions['translator']['cache']))
+    samples = []
+    for name, cache in caches:
+        samples.append(({'cache': name, 'result': 'hit'}, cache.hits))
+        samples.append(({'cache': name, 'result': 'miss'}, cache.misses))
+    return samples
+
+
+def active_users(app):
+    from app.models import User
+    since = datetime.utcnow() - timedelta(seconds=app.config['METRICS_ACTIVE_WINDOW'])
+    return [({}, User.query.filter(User.last_seen >= since).count())]
+
+
+def queue_depth(app):
+    from app import jobs
+    if app.config['JOBS_EAGER']:
+        return []
+    return [({'status': status}, count) for status, count in jobs.store.counts()
+            if status != 'done']
+
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != 'Bearer ' + token:
+            abort(403)
+    elif request.remote_addr not in current_app.config['METRICS_ALLOWED_IPS']:
+        abort(403)
+    app = current_app._get_current_object()
+    registry = app.extensions['metrics']['registry']
+    return current_app.response_class(registry.render(Metrics.samples(app)),
+                                      mimetype='text/plain; version=0.0.4')
@@ -1,11 +1,61 @@
-from datetime import datetime
-from hashlib import md5
+from datetime import datetime, timedelta
 from time import time
 from flask import current_app
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.ext.hybrid import hybrid_property
 import jwt
-from app import db, login
+from app import db, login, avatars
+from app import styles
+from app.avatars import email_hash
+
+
+class SearchableMixin(object):
+    """Models listing their text columns in ``__searchable__`` are kept in
+    the full text index by the session listeners below."""
+
+    @classmethod
+    def search(cls, expression, limit=None, options=()):
+        from app import search_index
+        ids = search_index.search(cls, expression, limit)
+        if not ids:
+            return []
+        when = [(id_, i) for i, id_ in enumerate(ids)]
+        return cls.query.options(*options).filter(cls.id.in_(ids)).order_by(
+            db.case(when, value=cls.id)).all()
+
+    @staticmethod
+    def after_flush(session, flush_context):
+        from app import search_index
+        added = [obj for obj in list(session.new) + list(session.dirty)
+                 if isinstance(obj, SearchableMixin)]
+        removed = [obj for obj in session.deleted if isinstance(obj, SearchableMixin)]
+        if not added and not removed:
+            return
+        if search_index.index.transactional:
+            search_index.apply(added, removed, session.connection())
+        else:
+            # the in-process index only sees committed rows
+            changes = session.info.setdefault('search_changes', ([], []))
+            changes[0].extend(added)
+            changes[1].extend(removed)
+
+    @staticmethod
+    def after_commit(session):
+        from app import search_index
+        added, removed = session.info.pop('search_changes', ([], []))
+        if added or removed:
+            search_index.apply(added, removed)
+
+    @staticmethod
+    def after_rollback(session):
+        session.info.pop('search_changes', None)
+
+
+db.event.listen(db.session, 'after_flush', SearchableMixin.after_flush)
+db.event.listen(db.session, 'after_commit', SearchableMixin.after_commit)
+db.event.listen(db.session, 'after_rollback', SearchableMixin.after_rollback)
+
 
 followers = db.Table(
     'followers',
@@ -19,6 +69,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(64), index=True, unique=True)
     email = db.Column(db.String(120), index=True, unique=True)
     password_hash = db.Column(db.String(128))
+    avatar_hash = db.Column(db.String(32), index=True)
     posts = db.relationship('Post', backref='author', lazy='dynamic')
     about_me = db.Column(db.String(140))
     last_seen = db.Column(db.DateTime, default=datetime.utcnow)
@@ -38,17 +89,23 @@ class User(UserMixin, db.Model):
         return check_password_hash(self.password_hash, password)
 
     def avatar(self, size):
-        digest = md5(self.email.lower().encode('utf-8')).hexdigest()
-        return 'https://www.gravatar.com/avatar/{}?d=identicon&s={}'.format(
-            digest, size)
+        # rows older than the avatar_hash column: see `flask avatars backfill`
+        digest = self.avatar_hash or email_hash(self.email)
+        return avatars.url(digest, size)
+
+    @staticmethod
+    def on_changed_email(target, value, oldvalue, initiator):
+        target.avatar_hash = email_hash(value) if value else None
 
     def follow(self, user_):
         if not self.is_following(user_):
             self.followed.append(user_)
+            TimelineEntry.add_author(self, user_)
 
     def unfollow(self, user_):
         if self.is_following(user_):
             self.followed.remove(user_)
+            TimelineEntry.remove_author(self, user_)
 
     def is_following(self, user_):
         return self.followed.filter(
@@ -61,6 +118,11 @@ class User(UserMixin, db.Model):
         own = Post.query.filter_by(user_id=self.id)
         return followed.union(own).order_by(Post.timestamp.desc())
 
+    def timeline(self):
+        # the inner join on the author skips the posts of deleted users
+        return Post.query.join(TimelineEntry, TimelineEntry.post_id == Post.id).join(
+            User, User.id == Post.user_id).filter(TimelineEntry.user_id == self.id)
+
     def get_reset_password_token(self, expires_in=600):
         return jwt.encode(
             {'reset_password': self.id, 'exp': time() + expires_in},
@@ -82,18 +144,104 @@ def load_user(id):
     return User.query.get(int(id))
 
 
-class Post(db.Model):
+db.event.listen(User.email, 'set', User.on_changed_email)
+
+
+class Post(SearchableMixin, db.Model):
+    __searchable__ = ['body']
     id = db.Column(db.Integer, primary_key=True)
     body = db.Column(db.String(140))
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     language = db.Column(db.String(5))
 
+    __table_args__ = (db.Index('ix_post_user_id_timestamp', 'user_id', 'timestamp'),)
+
     def __repr__(self):
         return '<Post {}>'.format(self.body)
 
 
-class Grape(db.Model):
+class Translation(db.Model):
+    key = db.Column(db.String(40), primary_key=True)
+    text = db.Column(db.Text)
+
+
+class TimelineEntry(db.Model):
+    """Materialized home timeline: one row per post a user should see.
+
+    Rows are written when a post is flushed (fan-out on write) and when a
+    user follows someone, so the home page reads a single indexed range
+    instead of joining followers with every post.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    timestamp = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_timeline_entry_feed', 'user_id', 'timestamp', 'post_id'),)
+
+    @staticmethod
+    def fan_out(session, post):
+        readers = db.select([followers.c.follower_id]).where(
+            followers.c.followed_id == post.user_id).union(
+            db.select([db.literal(post.user_id)])).alias()
+        session.execute(TimelineEntry.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'],
+            db.select([readers.c.follower_id, db.literal(post.id), db.literal(post.timestamp)])))
+
+    @staticmethod
+    def add_author(reader, author):
+        session = db.session()
+        session.execute(TimelineEntry.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'],
+            db.select([db.literal(reader.id), Post.id, Post.timestamp]).where(
+                Post.user_id == author.id)))
+
+    @staticmethod
+    def remove_author(reader, author):
+        TimelineEntry.query.filter(
+            TimelineEntry.user_id == reader.id,
+            TimelineEntry.post_id.in_(db.select([Post.id]).where(Post.user_id == author.id))).delete(
+            synchronize_session=False)
+
+    @staticmethod
+    def remove_user(user):
+        """Delete the timeline of ``user`` and their posts from every other."""
+        TimelineEntry.query.filter(db.or_(
+            TimelineEntry.user_id == user.id,
+            TimelineEntry.post_id.in_(db.select([Post.id]).where(Post.user_id == user.id)))).delete(
+            synchronize_session=False)
+
+    @staticmethod
+    def before_flush(session, flush_context, instances):
+        for obj in session.deleted:
+            if isinstance(obj, Post):
+                session.execute(TimelineEntry.__table__.delete().where(
+                    TimelineEntry.post_id == obj.id))
+
+    @staticmethod
+    def after_flush(session, flush_context):
+        for obj in session.new:
+            if isinstance(obj, Post):
+                TimelineEntry.fan_out(session, obj)
+
+    @staticmethod
+    def rebuild():
+        TimelineEntry.query.delete()
+        followed = db.select([followers.c.follower_id, Post.id, Post.timestamp]).where(
+            followers.c.followed_id == Post.user_id)
+        own = db.select([Post.user_id, Post.id, Post.timestamp]).where(
+            Post.user_id.in_(db.select([User.id])))
+        db.session.execute(TimelineEntry.__table__.insert().from_select(
+            ['user_id', 'post_id', 'timestamp'], followed.union(own)))
+        db.session.commit()
+
+
+db.event.listen(db.session, 'before_flush', TimelineEntry.before_flush)
+db.event.listen(db.session, 'after_flush', TimelineEntry.after_flush)
+
+
+class Grape(SearchableMixin, db.Model):
+    __searchable__ = ['name', 'regions', 'departments']
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(140))
     regions = db.Column(db.String(140))
@@ -104,16 +252,32 @@ class Grape(db.Model):
     red = db.Column(db.Boolean, index=True)
 
 
-class AOC(db.Model):
+def style_flag(bit):
+    def getter(self):
+        return bool((self.style or 0) & bit)
+
+    def setter(self, value):
+        self.style = (self.style or 0) | bit if value else (self.style or 0) & ~bit
+
+    def expression(cls):
+        return cls.style.op('&')(bit) != 0
+
+    return hybrid_property(getter, setter, expr=expression)
+
+
+class AOC(SearchableMixin, db.Model):
+    __searchable__ = ['name', 'vineyard']
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(140))
     vineyard = db.Column(db.String(140))
-    still_white_wine = db.Column(db.Boolean)
-    still_rose_wine = db.Column(db.Boolean)
-    still_red_wine = db.Column(db.Boolean)
-    sparkly_white_wine = db.Column(db.Boolean)
-    sparkly_rose_wine = db.Column(db.Boolean)
-    sparkly_red_wine = db.Column(db.Boolean)
+    # bitmask of app.styles flags, one small integer instead of six booleans
+    style = db.Column(db.SmallInteger, default=0, index=True)
+    still_white_wine = style_flag(styles.STILL_WHITE)
+    still_rose_wine = style_flag(styles.STILL_ROSE)
+    still_red_wine = style_flag(styles.STILL_RED)
+    sparkly_white_wine = style_flag(styles.SPARKLY_WHITE)
+    sparkly_rose_wine = style_flag(styles.SPARKLY_ROSE)
+    sparkly_red_wine = style_flag(styles.SPARKLY_RED)
 
     def __repr__(self):
         return '<AOC {}>'.format(self.name)
@@ -126,26 +290,163 @@ class Game(db.Model):
     score = db.Column(db.Integer, default=0)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     is_over = db.Column(db.Boolean, default=False)
+    token = db.Column(db.String(32), unique=True)
 
     def increment_score(self):
         self.score += 1
 
 
+class ReferenceVersion(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, default=0)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @staticmethod
+    def current():
+        row = ReferenceVersion.query.get(1)
+        return row.version if row is not None else 0
+
+    @staticmethod
+    def timestamp_of(version):
+        row = ReferenceVersion.query.get(1)
+        return row.timestamp if row is not None and row.version == version else None
+
+    @staticmethod
+    def bump():
+        updated = ReferenceVersion.query.filter_by(id=1).update(
+            {'version': ReferenceVersion.version + 1,
+             'timestamp': datetime.utcnow()})
+        if not updated:
+            db.session.add(ReferenceVersion(id=1, version=1))
+        db.session.commit()
+        return ReferenceVersion.current()
+
+
+class PlayerStats(db.Model):
+    player_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    game_type = db.Column(db.String(140), primary_key=True)
+    nb_played = db.Column(db.Integer, default=0)
+    best_score = db.Column(db.Integer, default=0)
+
+    @staticmethod
+    def record(game):
+        updated = PlayerStats.query.filter_by(
+            player_id=game.player_id, game_type=game.game_type).update(
+            {'nb_played': PlayerStats.nb_played + 1,
+             'best_score': db.case([(PlayerStats.best_score < game.score, game.score)],
+                                   else_=PlayerStats.best_score)},
+            synchronize_session=False)
+        if not updated:
+            db.session.add(PlayerStats(player_id=game.player_id, game_type=game.game_type,
+                                       nb_played=1, best_score=game.score))
+
+    @staticmethod
+    def rebuild():
+        PlayerStats.query.delete()
+        rows = db.session.query(
+            Game.player_id, Game.game_type, db.func.count(Game.id), db.func.max(Game.score)).filter(
+            Game.is_over.is_(True)).group_by(Game.player_id, Game.game_type)
+        db.session.bulk_insert_mappings(PlayerStats, [
+            {'player_id': player_id, 'game_type': game_type, 'nb_played': nb_played, 'best_score': best}
+            for player_id, game_type, nb_played, best in rows])
+        db.session.commit()
+
+
+class LeaderboardEntry(db.Model):
+    """One slot of a bounded top-K board.
+
+    A board is identified by ``game_type`` ('all' for every game) and
+    ``day`` (None for the all-time board). Each board keeps at most
+    ``LEADERBOARD_SIZE`` rows, so ranking never scans the game table.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    game_type = db.Column(db.String(140))
+    day = db.Column(db.Date, index=True)
+    score = db.Column(db.Integer)
+    player_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    player = db.relationship('User')
+
+    __table_args__ = (db.Index('ix_leaderboard_entry_board', 'game_type', 'day', 'score'),)
+
+    @staticmethod
+    def board(game_type, day):
+        return LeaderboardEntry.query.filter(LeaderboardEntry.game_type == game_type,
+                                             LeaderboardEntry.day == day if day is not None
+                                             else LeaderboardEntry.day.is_(None))
+
+    @staticmethod
+    def record(game):
+        size = current_app.config['LEADERBOARD_SIZE']
+        timestamp = game.timestamp or datetime.utcnow()
+        day = timestamp.date()
+        for game_type in (game.game_type, 'all'):
+            for board_day in (None, day):
+                board = LeaderboardEntry.board(game_type, board_day)
+                if board.count() >= size:
+                    lowest = board.order_by(LeaderboardEntry.score.asc(),
+                                            LeaderboardEntry.timestamp.desc()).first()
+                    if lowest.score >= game.score:
+                        continue
+                    db.session.delete(lowest)
+                db.session.add(LeaderboardEntry(game_type=game_type, day=board_day, score=game.score,
+                                                player_id=game.player_id, timestamp=timestamp))
+        window_start = day - timedelta(days=current_app.config['LEADERBOARD_WINDOW'])
+        LeaderboardEntry.query.filter(LeaderboardEntry.day < window_start).delete(
+            synchronize_session=False)
+
+    @staticmethod
+    def top(game_type='all', days=None):
+        if days is None:
+            query = LeaderboardEntry.board(game_type, None)
+        else:
+            # the best scores of the window are among the best of each day
+            since = datetime.utcnow().date() - timedelta(days=days - 1)
+            query = LeaderboardEntry.query.filter(LeaderboardEntry.game_type == game_type,
+                                                  LeaderboardEntry.day >= since)
+        return query.options(db.joinedload(LeaderboardEntry.player)).order_by(
+            LeaderboardEntry.score.desc(), LeaderboardEntry.timestamp.asc()).limit(
+            current_app.config['LEADERBOARD_SIZE']).all()
+
+    @staticmethod
+    def rebuild():
+        LeaderboardEntry.query.delete()
+        since = datetime.utcnow() - timedelta(days=current_app.config['LEADERBOARD_WINDOW'])
+        games = Game.query.filter(Game.is_over.is_(True))
+        for game_type in current_app.config['GAMES_TO_NAMES']:
+            for game in games.filter(Game.game_type == game_type, Game.timestamp < since).order_by(
+                    Game.score.desc()).limit(current_app.config['LEADERBOARD_SIZE']):
+                LeaderboardEntry.record(game)
+                db.session.flush()
+        for game in games.filter(Game.timestamp >= since).order_by(Game.timestamp.asc()):
+            LeaderboardEntry.record(game)
+            db.session.flush()
+        db.session.commit()
+
+
+def get_players_stats(users):
+    stats = {}
+    for row in PlayerStats.query.filter(PlayerStats.player_id.in_([u.id for u in users])):
+        stats[(row.player_id, row.game_type)] = row
+
+    result = {}
+    for user_ in users:
+        summary_per_type = []
+        nb_played_games = 0
+        for game_type, game_name in current_app.config['GAMES_TO_NAMES'].items():
+            row = stats.get((user_.id, game_type))
+            nb_played_games += row.nb_played if row is not None else 0
+            summary_per_type.append(
+                {
+                    'name': game_name,
+                    'type': game_type,
+                    'nb_played': row.nb_played if row is not None else 0,
+                    'best': row.best_score if row is not None else '-'
+                }
+            )
+        result[user_.id] = summary_per_type, nb_played_games
+    return result
+
+
 def get_player_stats(user_):
-    games = Game.query.filter_by(player_id=user_.id).all()
-    games_per_type = {}
-    for game_type, game_name in current_app.config['GAMES_TO_NAMES'].items():
-        games_per_type[(game_type, game_name)] = [game for game in games if game.game_type == game_type]
-
-    summary_per_type = []
-    for (game_type, game_name), games in games_per_type.items():
-        summary_per_type.append(
-            {
-                'name': game_name,
-                'type': game_type,
-                'nb_played': len(games),
-                'best': max(games, key=lambda x: x.score).score if len(games) > 0 else '-'
-            }
-        )
-
-        return summary_per_type, len(games)
+    return get_players_stats([user_])[user_.id]
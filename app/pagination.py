@@ -0,0 +1,136 @@
+import base64
+from bisect import bisect_left, bisect_right
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _dump(value):
+    if isinstance(value, datetime):
+        return {'t': (value - EPOCH) // timedelta(microseconds=1)}
+    return value
+
+
+def _load(value):
+    if isinstance(value, dict) and list(value) == ['t'] and _is_int(value['t']):
+        return EPOCH + timedelta(microseconds=value['t'])
+    if _is_int(value):
+        return value
+    raise ValueError('invalid cursor value')
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def encode_cursor(direction, values):
+    payload = json.dumps([direction, [_dump(v) for v in values]])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return the ``(direction, values)`` of a cursor, ``(None, None)`` if it
+    is invalid: the first page is served instead."""
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(payload.decode('utf-8'))
+        if direction not in ('next', 'prev') or not isinstance(values, list):
+            return None, None
+        return direction, [_load(v) for v in values]
+    except (ValueError, TypeError, OverflowError):
+        return None, None
+
+
+def _beyond(columns, values, descending):
+    # (c1, c2) < (v1, v2) spelled out so that every backend understands it
+    clauses = []
+    for i, column in enumerate(columns):
+        compare = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*[columns[j] == values[j] for j in range(i)] + [compare]))
+    return or_(*clauses)
+
+
+class CursorPage(object):
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def cursor_paginate(query, columns, cursor, per_page, descending=True, key=None):
+    """Keyset pagination: every page costs one indexed range scan.
+
+    ``columns`` is the unique sort key, ``key`` extracts its values from a
+    result item (by default the attributes named like the columns).
+    """
+    if key is None:
+        def key(item):
+            return [getattr(item, column.key) for column in columns]
+
+    direction, values = decode_cursor(cursor) if cursor else (None, None)
+    if values is not None and (len(values) != len(columns) or not all(
+            isinstance(v, c.type.python_type) for v, c in zip(values, columns))):
+        direction, values = None, None
+    backwards = direction == 'prev'
+
+    if values is not None:
+        query = query.filter(_beyond(columns, values, descending != backwards))
+    order = descending != backwards
+    query = query.order_by(*[c.desc() if order else c.asc() for c in columns])
+    items = query.limit(per_page + 1).all()
+
+    more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+
+    next_cursor = prev_cursor = None
+    if items:
+        if more or backwards:
+            next_cursor = encode_cursor('next', key(items[-1]))
+        if (more and backwards) or (direction == 'next'):
+            prev_cursor = encode_cursor('prev', key(items[0]))
+    return CursorPage(items, next_cursor, prev_cursor)
+
+
+def paginate_sorted(keys, cursor, per_page):
+    """cursor_paginate over an ascending in-memory sequence of unique keys.
+
+    Cursors are interchangeable with the ones of an ascending
+    ``cursor_paginate`` on the same single column.
+    """
+    direction, values = decode_cursor(cursor) if cursor else (None, None)
+    if values is None or len(values) != 1 or not isinstance(values[0], int):
+        direction, values = None, None
+    backwards = direction == 'prev'
+
+    if values is None:
+        start, end = 0, per_page
+        more = len(keys) > end
+    elif backwards:
+        end = bisect_left(keys, values[0])
+        start = max(end - per_page, 0)
+        more = start > 0
+    else:
+        start = bisect_right(keys, values[0])
+        end = start + per_page
+        more = len(keys) > end
+    items = list(keys[start:end])
+
+    next_cursor = prev_cursor = None
+    if items:
+        if more or backwards:
+            next_cursor = encode_cursor('next', [items[-1]])
+        if (more and backwards) or (direction == 'next'):
+            prev_cursor = encode_cursor('prev', [items[0]])
+    return CursorPage(items, next_cursor, prev_cursor)
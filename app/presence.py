@@ -0,0 +1,69 @@
+import atexit
+import threading
+from datetime import datetime, timedelta
+from time import time
+from flask import current_app
+
+
+class _PresenceState(object):
+    def __init__(self):
+        self.pending = {}
+        self.flushed_at = time()
+        self.lock = threading.Lock()
+
+
+class PresenceTracker(object):
+    """Buffers last seen timestamps and writes them in batches.
+
+    A user is only buffered when the stored ``last_seen`` is older than
+    ``LAST_SEEN_THRESHOLD`` seconds, and the buffer is written with a single
+    executemany UPDATE at most once every ``LAST_SEEN_FLUSH_INTERVAL``
+    seconds, instead of committing on every request. What is left in the
+    buffer is written when the process exits.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LAST_SEEN_THRESHOLD', 300)
+        app.config.setdefault('LAST_SEEN_FLUSH_INTERVAL', 60)
+        app.extensions['presence'] = _PresenceState()
+        if not app.testing:
+            atexit.register(self.shutdown, app)
+
+    @property
+    def _state(self):
+        return current_app.extensions['presence']
+
+    def touch(self, user):
+        now = datetime.utcnow()
+        threshold = timedelta(seconds=current_app.config['LAST_SEEN_THRESHOLD'])
+        if user.last_seen is not None and now - user.last_seen < threshold:
+            return
+        state = self._state
+        with state.lock:
+            state.pending[user.id] = now
+        if time() - state.flushed_at >= current_app.config['LAST_SEEN_FLUSH_INTERVAL']:
+            self.flush()
+
+    def shutdown(self, app):
+        with app.app_context():
+            self.flush()
+
+    def flush(self):
+        from app import db
+        from app.models import User
+        state = self._state
+        with state.lock:
+            pending, state.pending = state.pending, {}
+            state.flushed_at = time()
+        if not pending:
+            return
+        table = User.__table__
+        db.session.execute(
+            table.update().where(table.c.id == db.bindparam('user_id')).values(
+                last_seen=db.bindparam('seen')),
+            [{'user_id': user_id, 'seen': seen} for user_id, seen in pending.items()])
+        db.session.commit()
@@ -0,0 +1,142 @@
+import random
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from time import time
+from types import MappingProxyType
+from flask import abort, current_app
+import jwt
+from app import styles
+
+Question = namedtuple('Question', ['id', 'name', 'red', 'white',
+                                   'positive_vineyards', 'negative_vineyards'])
+
+
+class QuestionPool(object):
+    """Eligible questions of one game type, drawn in constant time."""
+
+    def __init__(self, questions):
+        self.questions = tuple(questions)
+        self.by_id = MappingProxyType({q.id: q for q in self.questions})
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, question_id):
+        return question_id in self.by_id
+
+    def get(self, question_id):
+        return self.by_id.get(question_id)
+
+    def get_or_404(self, question_id):
+        question = self.by_id.get(question_id)
+        if question is None:
+            abort(404)
+        return question
+
+    def draw(self):
+        return random.choice(self.questions)
+
+
+def _split_vineyards(found, vineyards):
+    positives = tuple(v for v in vineyards if v in found)
+    negatives = tuple(v for v in vineyards if v not in found)
+    return positives, negatives
+
+
+def grape_color_questions(grapes, vineyards):
+    for grape in grapes:
+        if grape.red is not None:
+            yield Question(grape.id, grape.name, grape.red, not grape.red, (), ())
+
+
+def grape_region_questions(grapes, vineyards):
+    for grape in grapes:
+        positives, negatives = _split_vineyards(grape.vineyard_set, vineyards)
+        # grapes without any (or with every) vineyard cannot be asked
+        if positives and negatives:
+            yield Question(grape.id, grape.name, grape.red, not grape.red,
+                           positives, negatives)
+
+
+def aoc_color_questions(aocs, vineyards):
+    for aoc in aocs:
+        red = bool(aoc.style & styles.RED)
+        white = bool(aoc.style & (styles.WHITE | styles.ROSE))
+        if red or white:
+            yield Question(aoc.id, aoc.name, red, white, (), ())
+
+
+def aoc_region_questions(aocs, vineyards):
+    for aoc in aocs:
+        positives, negatives = _split_vineyards(aoc.vineyard_set, vineyards)
+        if positives and negatives:
+            yield Question(aoc.id, aoc.name.split(' ou')[0], None, None,
+                           positives, negatives)
+
+
+QUESTION_BUILDERS = {
+    'quiz_grape_color': ('grapes', grape_color_questions),
+    'quiz_grape_region': ('grapes', grape_region_questions),
+    'quiz_aoc_color': ('aocs', aoc_color_questions),
+    'quiz_aoc_region': ('aocs', aoc_region_questions),
+}
+
+
+def build_pools(reference, game_types, vineyards):
+    pools = {}
+    for game_type in game_types:
+        table, builder = QUESTION_BUILDERS[game_type]
+        records = getattr(reference, table).values()
+        pools[game_type] = QuestionPool(builder(records, vineyards))
+    return MappingProxyType(pools)
+
+
+class SignedRound(object):
+    """In-progress game carried by a signed token instead of a Game row.
+
+    The token binds the player, game type, score and current question, so
+    a round cannot be tampered with. Only the final result is written to
+    the database, and the nonce keeps a replayed token from recording the
+    same game twice.
+    """
+
+    def __init__(self, player_id, game_type, question_id, score=0,
+                 started=None, nonce=None):
+        self.player_id = player_id
+        self.game_type = game_type
+        self.question_id = question_id
+        self.score = score
+        self.started = started if started is not None else int(time())
+        self.nonce = nonce or uuid.uuid4().hex
+        self.is_over = False
+
+    def increment_score(self):
+        self.score += 1
+
+    @property
+    def id(self):
+        return self.get_token()
+
+    def get_token(self):
+        return jwt.encode(
+            {'quiz': [self.player_id, self.game_type, self.question_id,
+                      self.score, self.started, self.nonce],
+             'exp': time() + current_app.config['QUIZ_ROUND_EXPIRATION']},
+            current_app.config['SECRET_KEY'],
+            algorithm='HS256').decode('utf-8')
+
+    @staticmethod
+    def verify_token(token):
+        try:
+            state = jwt.decode(token, current_app.config['SECRET_KEY'],
+                               algorithms=['HS256'])['quiz']
+        except:
+            return
+        return SignedRound(*state)
+
+    def to_game(self):
+        from app.models import Game
+        return Game(player_id=self.player_id, game_type=self.game_type,
+                    score=self.score, is_over=True, token=self.nonce,
+                    timestamp=datetime.utcfromtimestamp(self.started))
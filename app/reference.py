@@ -0,0 +1,139 @@
+from bisect import bisect_left, bisect_right
+import threading
+from collections import namedtuple
+from time import time
+from types import MappingProxyType
+from flask import current_app, abort
+from app.quiz import build_pools
+from app.suggest import build_suggestions, suggest_key
+from app.vineyards import get_normalizer
+
+GRAPE_COLUMNS = ['id', 'name', 'regions', 'vineyards', 'departments',
+                 'area_fr', 'area_world', 'red']
+AOC_COLUMNS = ['id', 'name', 'vineyard', 'style']
+
+# vineyard_set holds the canonical vineyards resolved once at load time
+GrapeRecord = namedtuple('GrapeRecord', GRAPE_COLUMNS + ['vineyard_set'])
+AOCRecord = namedtuple('AOCRecord', AOC_COLUMNS + ['vineyard_set'])
+
+
+class ReferenceData(object):
+    """Immutable snapshot of the grape and AOC tables, keyed by id."""
+
+    def __init__(self, version, grapes, aocs, game_types=(), vineyards=(), suggest_size=10,
+                 timestamp=None):
+        self.version = version
+        self.timestamp = timestamp
+        self.grapes = MappingProxyType({grape.id: grape for grape in grapes})
+        self.aocs = MappingProxyType({aoc.id: aoc for aoc in aocs})
+        self.grape_ids = tuple(sorted(self.grapes))
+        self.aoc_ids = tuple(sorted(self.aocs))
+        self.pools = build_pools(self, game_types, vineyards)
+        self.suggestions = build_suggestions(grapes, aocs, suggest_size)
+
+    def suggest(self, text, limit=None):
+        """``(kind, id, name)`` of the grapes and AOCs whose name or one of
+        its words starts with ``text``, best first."""
+        prefix = suggest_key(text)
+        return self.suggestions.search(prefix, limit) if prefix else []
+
+    @staticmethod
+    def _neighbors(ids, id_):
+        # ids are sorted, so gaps in the table are skipped
+        left = bisect_left(ids, id_)
+        right = bisect_right(ids, id_)
+        return (ids[left - 1] if left > 0 else None,
+                ids[right] if right < len(ids) else None)
+
+    def grape_neighbors(self, grape_id):
+        return self._neighbors(self.grape_ids, grape_id)
+
+    def aoc_neighbors(self, aoc_id):
+        return self._neighbors(self.aoc_ids, aoc_id)
+
+    def grape_or_404(self, grape_id):
+        grape = self.grapes.get(grape_id)
+        if grape is None:
+            abort(404)
+        return grape
+
+    def aoc_or_404(self, aoc_id):
+        aoc = self.aocs.get(aoc_id)
+        if aoc is None:
+            abort(404)
+        return aoc
+
+
+class _CatalogState(object):
+    def __init__(self):
+        self.data = None
+        self.checked_at = 0
+        self.lock = threading.Lock()
+
+
+class ReferenceCatalog(object):
+    """Per-worker cache of the reference tables.
+
+    The snapshot is reloaded when the version stamp stored in the
+    ``reference_version`` table changes. Workers look the stamp up at most
+    once every ``REFERENCE_CHECK_INTERVAL`` seconds, so every gunicorn worker
+    picks up a reload within that delay without querying on each request.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('REFERENCE_CHECK_INTERVAL', 30)
+        app.config.setdefault('SUGGEST_SIZE', 10)
+        app.extensions['reference_catalog'] = _CatalogState()
+
+    @property
+    def _state(self):
+        return current_app.extensions['reference_catalog']
+
+    @property
+    def data(self):
+        state = self._state
+        now = time()
+        if state.data is not None and \
+                now - state.checked_at < current_app.config['REFERENCE_CHECK_INTERVAL']:
+            return state.data
+        with state.lock:
+            if state.data is None or \
+                    now - state.checked_at >= current_app.config['REFERENCE_CHECK_INTERVAL']:
+                from app.models import ReferenceVersion
+                version = ReferenceVersion.current()
+                if state.data is None or state.data.version != version:
+                    state.data = self._load(version)
+                state.checked_at = now
+        return state.data
+
+    def bump(self):
+        from app.models import ReferenceVersion
+        ReferenceVersion.bump()
+        self.invalidate()
+
+    def invalidate(self):
+        state = self._state
+        with state.lock:
+            state.data = None
+            state.checked_at = 0
+
+    @staticmethod
+    def _load(version):
+        from app.models import Grape, AOC, ReferenceVersion
+        normalize = get_normalizer(tuple(current_app.config['VINEYARDS'])).normalize
+        grapes = [GrapeRecord(*row, vineyard_set=normalize(row.vineyards))
+                  for row in Grape.query.with_entities(
+                      *[getattr(Grape, column) for column in GRAPE_COLUMNS])]
+        aocs = [AOCRecord(row.id, row.name, row.vineyard, row.style or 0,
+                          vineyard_set=normalize(row.vineyard))
+                for row in AOC.query.with_entities(
+                    *[getattr(AOC, column) for column in AOC_COLUMNS])]
+        return ReferenceData(version, grapes, aocs,
+                             game_types=current_app.config['GAMES_TO_NAMES'],
+                             vineyards=current_app.config['VINEYARDS'],
+                             suggest_size=current_app.config['SUGGEST_SIZE'],
+                             timestamp=ReferenceVersion.timestamp_of(version))
@@ -0,0 +1,254 @@
+import re
+import sqlite3
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from flask import current_app
+
+_token = re.compile(r'\w+')
+
+
+def fold(text):
+    """Lower case and strip the accents, so that 'cotes du rhone' finds 'Côtes du Rhône'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    return _token.findall(fold(text))
+
+
+def document(obj):
+    return ' '.join(getattr(obj, field) or '' for field in obj.__searchable__)
+
+
+class MemoryIndex(object):
+    """Pure Python inverted index, one per process.
+
+    Every kind keeps its postings (token -> ids) and a sorted list of its
+    tokens, so the ids of a prefix are found with a bisect.
+    """
+    transactional = False
+
+    def __init__(self):
+        self.postings = defaultdict(lambda: defaultdict(set))
+        self.documents = defaultdict(dict)
+        self.terms = {}
+        self.last_post_id = 0
+        self.lock = threading.RLock()
+
+    def add(self, kind, id_, text):
+        with self.lock:
+            self._remove(kind, id_)
+            tokens = set(tokenize(text))
+            self.documents[kind][id_] = tokens
+            for token in tokens:
+                self.postings[kind][token].add(id_)
+            self.terms.pop(kind, None)
+
+    def remove(self, kind, id_):
+        with self.lock:
+            self._remove(kind, id_)
+
+    def _remove(self, kind, id_):
+        for token in self.documents[kind].pop(id_, ()):
+            ids = self.postings[kind][token]
+            ids.discard(id_)
+            if not ids:
+                del self.postings[kind][token]
+            self.terms.pop(kind, None)
+
+    def clear(self, kind):
+        with self.lock:
+            self.postings.pop(kind, None)
+            self.documents.pop(kind, None)
+            self.terms.pop(kind, None)
+
+    def _prefixed(self, kind, prefix):
+        terms = self.terms.get(kind)
+        if terms is None:
+            terms = self.terms[kind] = sorted(self.postings[kind])
+        ids = set()
+        i = bisect_left(terms, prefix)
+        while i < len(terms) and terms[i].startswith(prefix):
+            ids |= self.postings[kind][terms[i]]
+            i += 1
+        return ids
+
+    def query(self, kind, tokens, limit):
+        with self.lock:
+            found = None
+            for token in tokens:
+                ids = self._prefixed(kind, token)
+                found = ids if found is None else found & ids
+                if not found:
+                    return []
+            # whole word matches first, then the oldest rows
+            documents = self.documents[kind]
+            return sorted(found, key=lambda id_: (
+                -len(documents[id_].intersection(tokens)), id_))[:limit]
+
+
+class Fts5Index(object):
+    """SQLite FTS5 table shared by every worker, written in the same
+    transaction as the indexed rows."""
+    transactional = True
+
+    create = ("CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+              "kind UNINDEXED, ref UNINDEXED, body, "
+              "tokenize = 'unicode61 remove_diacritics 2')")
+
+    @staticmethod
+    def available():
+        try:
+            sqlite3.connect(':memory:').execute(
+                'CREATE VIRTUAL TABLE probe USING fts5(body)')
+        except sqlite3.OperationalError:
+            return False
+        return True
+
+    @staticmethod
+    def ensure(connection):
+        # joins the caller's transaction, so it is safe inside a flush
+        connection.execute(Fts5Index.create)
+
+    @staticmethod
+    def count(kind, connection):
+        Fts5Index.ensure(connection)
+        return connection.execute('SELECT count(*) FROM search_index WHERE kind = ?',
+                                  (kind,)).scalar()
+
+    @staticmethod
+    def add(kind, id_, text, connection):
+        Fts5Index.remove(kind, id_, connection)
+        connection.execute(
+            'INSERT INTO search_index (kind, ref, body) VALUES (?, ?, ?)',
+            (kind, id_, ' '.join(tokenize(text))))
+
+    @staticmethod
+    def remove(kind, id_, connection):
+        connection.execute('DELETE FROM search_index WHERE kind = ? AND ref = ?', (kind, id_))
+
+    @staticmethod
+    def clear(kind, connection):
+        connection.execute('DELETE FROM search_index WHERE kind = ?', (kind,))
+
+    @staticmethod
+    def query(kind, tokens, limit, connection):
+        Fts5Index.ensure(connection)
+        match = ' '.join('"{}"*'.format(token) for token in tokens)
+        return [row[0] for row in connection.execute(
+            'SELECT ref FROM search_index WHERE search_index MATCH ? AND kind = ? '
+            'ORDER BY rank LIMIT ?', (match, kind, limit))]
+
+
+class SearchIndex(object):
+    """Full text index of the ``__searchable__`` models.
+
+    ``SEARCH_BACKEND`` picks ``fts5``, ``memory`` or ``auto`` (FTS5 when the
+    database is a SQLite build that has it). Posts are indexed as they are
+    flushed; grapes and AOCs are reindexed whenever the reference data
+    version changes, since the bulk loaders bypass the session.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_BACKEND', 'auto')
+        app.config.setdefault('SEARCH_RESULTS', 10)
+        app.extensions['search'] = {'index': None, 'version': None, 'lock': threading.RLock()}
+
+    @property
+    def _state(self):
+        return current_app.extensions['search']
+
+    @property
+    def index(self):
+        state = self._state
+        if state['index'] is None:
+            with state['lock']:
+                if state['index'] is None:
+                    state['index'] = self._create()
+        return state['index']
+
+    def _create(self):
+        from app import db
+        backend = current_app.config['SEARCH_BACKEND']
+        if backend == 'fts5' or (backend == 'auto' and db.engine.dialect.name == 'sqlite' and
+                                 Fts5Index.available()):
+            return Fts5Index()
+        return MemoryIndex()
+
+    def apply(self, added, removed, connection=None):
+        """Index ``added`` and unindex ``removed`` searchable objects."""
+        index = self.index
+        if index.transactional:
+            index.ensure(connection)
+            for obj in removed:
+                index.remove(obj.__tablename__, obj.id, connection)
+            for obj in added:
+                index.add(obj.__tablename__, obj.id, document(obj), connection)
+        else:
+            for obj in removed:
+                index.remove(obj.__tablename__, obj.id)
+            for obj in added:
+                index.add(obj.__tablename__, obj.id, document(obj))
+
+    def reindex(self, model):
+        from app import db
+        rows = model.query.with_entities(model.id, *[getattr(model, field)
+                                                     for field in model.__searchable__])
+        kind = model.__tablename__
+        if self.index.transactional:
+            connection = db.session.connection()
+            self.index.ensure(connection)
+            self.index.clear(kind, connection)
+            for row in rows:
+                self.index.add(kind, row[0], ' '.join(v or '' for v in row[1:]), connection)
+            db.session.commit()
+        else:
+            self.index.clear(kind)
+            for row in rows:
+                self.index.add(kind, row[0], ' '.join(v or '' for v in row[1:]))
+
+    def refresh(self):
+        from app import db, catalog
+        from app.models import Grape, AOC, Post
+        state = self._state
+        version = catalog.data.version
+        index = self.index
+        with state['lock']:
+            if state['version'] != version:
+                self.reindex(Grape)
+                self.reindex(AOC)
+                if state['version'] is None and (not index.transactional or
+                                                 self._count('post') != Post.query.count()):
+                    self.reindex(Post)
+                    index.last_post_id = Post.query.with_entities(
+                        db.func.max(Post.id)).scalar() or 0
+                state['version'] = version
+            if not index.transactional:
+                # posts flushed by the other workers since the last search
+                for post in Post.query.filter(Post.id > index.last_post_id).order_by(Post.id):
+                    index.add('post', post.id, document(post))
+                    index.last_post_id = post.id
+
+    def _count(self, kind):
+        from app import db
+        return self.index.count(kind, db.session.connection())
+
+    def search(self, model, text, limit=None):
+        """Ids of the ``model`` rows matching every word of ``text`` as a
+        prefix, best matches first."""
+        from app import db
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+        self.refresh()
+        limit = limit or current_app.config['SEARCH_RESULTS']
+        if self.index.transactional:
+            return self.index.query(model.__tablename__, tokens, limit, db.session.connection())
+        return self.index.query(model.__tablename__, tokens, limit)
@@ -0,0 +1,30 @@
+# Wine styles an AOC may produce, packed into AOC.style
+STILL_WHITE = 1
+STILL_ROSE = 2
+STILL_RED = 4
+SPARKLY_WHITE = 8
+SPARKLY_ROSE = 16
+SPARKLY_RED = 32
+
+FLAGS = [
+    ('still_white_wine', STILL_WHITE),
+    ('still_rose_wine', STILL_ROSE),
+    ('still_red_wine', STILL_RED),
+    ('sparkly_white_wine', SPARKLY_WHITE),
+    ('sparkly_rose_wine', SPARKLY_ROSE),
+    ('sparkly_red_wine', SPARKLY_RED),
+]
+
+RED = STILL_RED | SPARKLY_RED
+WHITE = STILL_WHITE | SPARKLY_WHITE
+ROSE = STILL_ROSE | SPARKLY_ROSE
+STILL = STILL_WHITE | STILL_ROSE | STILL_RED
+SPARKLING = SPARKLY_WHITE | SPARKLY_ROSE | SPARKLY_RED
+
+
+def pack(**flags):
+    style = 0
+    for name, bit in FLAGS:
+        if flags.get(name):
+            style |= bit
+    return style
@@ -0,0 +1,69 @@
+import re
+from app.search import fold
+
+_separators = re.compile(r'\W+')
+
+
+def suggest_key(text):
+    """Accent and punctuation insensitive form: 'Châteauneuf-du-Pape' ->
+    'chateauneuf du pape'."""
+    return _separators.sub(' ', fold(text)).strip()
+
+
+class PrefixTrie(object):
+    """Character trie whose nodes hold their best ``size`` values.
+
+    The ranking is done once when the trie is built, so a lookup walks
+    ``len(prefix)`` nodes and returns a precomputed list.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.root = ({}, [])
+
+    def insert(self, key, rank, value):
+        node = self.root
+        for char in key:
+            node = node[0].setdefault(char, ({}, []))
+            node[1].append((rank, value))
+
+    def freeze(self):
+        stack = [self.root]
+        while stack:
+            children, entries = stack.pop()
+            best = {}
+            for rank, value in sorted(entries, key=lambda entry: entry[0]):
+                best.setdefault(value, rank)
+            entries[:] = list(best)[:self.size]
+            stack.extend(children.values())
+
+    def search(self, prefix, limit=None):
+        node = self.root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return []
+        return node[1][:limit or self.size]
+
+
+def build_suggestions(grapes, aocs, size):
+    """Trie over grape and AOC names, values are ``(kind, id, name)``.
+
+    Every word of a name is a way in ('emil' finds Saint-Émilion), but
+    names starting with the prefix come first. Among those, grapes are
+    ranked by their planted area in France, the only popularity figure in
+    the reference data, and ties go to the shortest name.
+    """
+    trie = PrefixTrie(size)
+    for kind, records, popularity in (
+            ('grape', grapes, lambda grape: grape.area_fr or 0),
+            ('aoc', aocs, lambda aoc: 0)):
+        for record in records:
+            key = suggest_key(record.name)
+            value = (kind, record.id, record.name)
+            words = key.split(' ')
+            for i in range(len(words)):
+                rank = (i > 0, -popularity(record), len(key), key)
+                trie.insert(' '.join(words[i:]), rank, value)
+    trie.freeze()
+    return trie
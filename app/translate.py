@@ -1,19 +1,152 @@
+import hashlib
 import json
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
 from flask_babel import _
+from app.caching import LRUCache
+
+
+class TranslationError(Exception):
+    pass
+
+
+class MicrosoftBackend(object):
+    url = 'https://api.cognitive.microsofttranslator.com/translate'
+
+    def __init__(self, app):
+        # one pooled session per worker, reused by every request thread
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_maxsize=app.config['TRANSLATOR_POOL_SIZE'], max_retries=0))
+
+    def translate(self, texts, source_language, dest_language):
+        if not current_app.config.get('MS_TRANSLATOR_KEY'):
+            raise TranslationError(_('Error: the translation service is not configured.'))
+        headers = {'Ocp-Apim-Subscription-Key': current_app.config['MS_TRANSLATOR_KEY']}
+        if current_app.config.get('MS_TRANSLATOR_REGION'):
+            headers['Ocp-Apim-Subscription-Region'] = current_app.config['MS_TRANSLATOR_REGION']
+        try:
+            r = self.session.post(
+                self.url, headers=headers,
+                params={'api-version': '3.0', 'from': source_language, 'to': dest_language},
+                json=[{'Text': text} for text in texts],
+                timeout=current_app.config['TRANSLATOR_TIMEOUT'])
+        except requests.RequestException:
+            raise TranslationError(_('Error: the translation service failed.'))
+        if r.status_code != 200:
+            raise TranslationError(_('Error: the translation service failed.'))
+        try:
+            translated = [item['translations'][0]['text']
+                          for item in json.loads(r.content.decode('utf-8-sig'))]
+        except (KeyError, IndexError, TypeError, ValueError):
+            raise TranslationError(_('Error: the translation service failed.'))
+        if len(translated) != len(texts):
+            raise TranslationError(_('Error: the translation service failed.'))
+        return translated
+
+
+class LocalBackend(object):
+    """Offline stand-in that tags the text with the target language."""
+
+    def __init__(self, app):
+        self.calls = 0
+
+    def translate(self, texts, source_language, dest_language):
+        self.calls += 1
+        return ['[{}] {}'.format(dest_language, text) for text in texts]
+
+
+BACKENDS = {
+    'microsoft': MicrosoftBackend,
+    'local': LocalBackend,
+}
+
+
+def cache_key(text, source_language, dest_language):
+    return hashlib.sha1(u'\0'.join(
+        [source_language or '', dest_language, text]).encode('utf-8')).hexdigest()
+
+
+class Translator(object):
+    """Translation service with a two level cache.
+
+    Translations are content addressed by (text, source, dest). Lookups go
+    to an in-process LRU, then to the persistent ``translation`` table, and
+    only the remaining texts are sent to the backend, in a single call.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TRANSLATOR_BACKEND', 'microsoft')
+        app.config.setdefault('TRANSLATOR_TIMEOUT', 5)
+        app.config.setdefault('TRANSLATOR_POOL_SIZE', 10)
+        app.config.setdefault('TRANSLATOR_CACHE_SIZE', 1024)
+        app.extensions['translator'] = {
+            'backend': BACKENDS[app.config['TRANSLATOR_BACKEND']](app),
+            'cache': LRUCache(app.config['TRANSLATOR_CACHE_SIZE']),
+        }
+
+    @property
+    def backend(self):
+        return current_app.extensions['translator']['backend']
+
+    @property
+    def cache(self):
+        return current_app.extensions['translator']['cache']
+
+    def translate_many(self, texts, source_language, dest_language):
+        from app import db
+        from app.models import Translation
+        keys = [cache_key(text, source_language, dest_language) for text in texts]
+        found = {}
+        for key in keys:
+            value = self.cache.get(key)
+            if value is not None:
+                found[key] = value
+
+        missing = [key for key in set(keys) if key not in found]
+        if missing:
+            for row in Translation.query.filter(Translation.key.in_(missing)):
+                found[row.key] = row.text
+                self.cache.set(row.key, row.text)
+
+        todo = OrderedDict((key, text) for key, text in zip(keys, texts) if key not in found)
+        if todo:
+            translated = self.backend.translate(list(todo.values()), source_language, dest_language)
+            for key, text in zip(todo, translated):
+                found[key] = text
+                self.cache.set(key, text)
+                db.session.merge(Translation(key=key, text=text))
+            db.session.commit()
+        return [found[key] for key in keys]
+
+    def translate(self, text, source_language, dest_language):
+        return self.translate_many([text], source_language, dest_language)[0]
 
 
 def translate(text, source_language, dest_language):
-    if 'MS_TRANSLATOR_KEY' not in current_app.config or \
-            not current_app.config['MS_TRANSLATOR_KEY']:
-        return _('Error: the translation service is not configured.')
-    auth = {
-        'Ocp-Apim-Subscription-Key': current_app.config['MS_TRANSLATOR_KEY']}
-    r = requests.get('https://api.microsofttranslator.com/v2/Ajax.svc'
-                     '/Translate?text={}&from={}&to={}'.format(
-                         text, source_language, dest_language),
-                     headers=auth)
-    if r.status_code != 200:
-        return _('Error: the translation service failed.')
-    return json.loads(r.content.decode('utf-8-sig'))
+    from app import translator
+    try:
+        return translator.translate(text, source_language, dest_language)
+    except TranslationError as e:
+        return str(e)
+
+
+def translate_posts(posts, dest_language):
+    """Translate ``{post_id: (text, source_language)}`` with one backend
+    call per source language."""
+    from app import translator
+    by_language = {}
+    for post_id, (text, source_language) in posts.items():
+        by_language.setdefault(source_language, []).append((post_id, text))
+    result = {}
+    for source_language, items in by_language.items():
+        translated = translator.translate_many([text for post_id, text in items],
+                                               source_language, dest_language)
+        result.update(zip([post_id for post_id, text in items], translated))
+    return result
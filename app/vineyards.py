@@ -0,0 +1,49 @@
+import re
+from functools import lru_cache
+
+# historical or local names used by the data sources, mapped to the
+# vineyard whose map is shown in the region quizzes
+ALIASES = {
+    'lorraine': 'champagne',
+    'lyonnais': 'rhone',
+    'beaujolais': 'bourgogne',
+    'limousin': 'sud-ouest',
+    'charentes': 'bordeaux',
+}
+
+ACCENTS = str.maketrans(u'àâäéèêëîïôöûüç', u'aaaeeeeiioouuc')
+
+
+class VineyardNormalizer(object):
+    """Maps a free-text vineyard field to the set of canonical vineyards.
+
+    Every canonical name and alias is compiled into one alternation, so a
+    single ``finditer`` pass resolves the whole string, and results are
+    memoized per raw string.
+    """
+
+    def __init__(self, vineyards, aliases=ALIASES):
+        self.vineyards = tuple(vineyards)
+        self.mapping = {name: name for name in self.vineyards}
+        self.mapping.update({alias: name for alias, name in aliases.items()
+                             if name in self.mapping})
+        # longest first so that an alias is never shadowed by a prefix
+        names = sorted(self.mapping, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(
+            r'\s*-\s*'.join(re.escape(part) for part in name.split('-'))
+            for name in names))
+        self.normalize = lru_cache(maxsize=4096)(self._normalize)
+
+    def _key(self, match):
+        return self.mapping[re.sub(r'\s+', '', match.group(0))]
+
+    def _normalize(self, raw):
+        if not raw:
+            return frozenset()
+        text = raw.lower().translate(ACCENTS)
+        return frozenset(self._key(match) for match in self.pattern.finditer(text))
+
+
+@lru_cache(maxsize=8)
+def get_normalizer(vineyards):
+    return VineyardNormalizer(vineyards)
@@ -0,0 +1,29 @@
+"""Benchmarks of the quiz and explore hot paths.
+
+Seed a synthetic database, then drive the application through the Flask
+test client::
+
+    python -m benchmarks.seed --scale 0.01
+    python -m benchmarks.run --save before
+    # ... change the code ...
+    python -m benchmarks.run --compare before
+
+``--scale 1`` seeds 100k users, 2M games and 1M posts. The baselines are
+written to ``benchmarks/baselines``.
+"""
+import os
+from config import Config
+
+BENCH_DIR = os.path.abspath(os.path.dirname(__file__))
+DEFAULT_DATABASE = os.path.join(BENCH_DIR, 'bench.db')
+PASSWORD = 'bench'
+
+
+def bench_config(database):
+    class BenchConfig(Config):
+        # TESTING keeps the file logs and the job threads out of the way
+        TESTING = True
+        WTF_CSRF_ENABLED = False
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(database)
+        SQL_STATS_HEADERS = True
+    return BenchConfig
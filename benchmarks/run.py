@@ -0,0 +1,228 @@
+"""Drive the hot paths through the test client and report per endpoint.
+
+Every scenario is drawn from a seeded generator (and so are the questions
+of the quizzes), so two runs against the same database send the same
+requests. Latencies are wall clock times of ``client.open`` and the query
+counts come from the ``X-DB-Queries`` header of the SQL instrumentation.
+The games played are written to the database: seed it again for runs
+that must start from the same state.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+from collections import defaultdict
+from time import perf_counter
+from urllib.parse import urlsplit
+from benchmarks import BENCH_DIR, DEFAULT_DATABASE, PASSWORD, bench_config
+
+BASELINES = os.path.join(BENCH_DIR, 'baselines')
+QUIZZES = ['quiz_grape_color', 'quiz_grape_region', 'quiz_aoc_color', 'quiz_aoc_region']
+
+
+class Recorder(object):
+    def __init__(self, app):
+        self.adapter = app.url_map.bind('localhost')
+        self.samples = defaultdict(list)
+        self.enabled = True
+
+    def request(self, client, url, method='GET', data=None):
+        start = perf_counter()
+        response = client.open(url, method=method, data=data)
+        elapsed = perf_counter() - start
+        if response.status_code >= 400:
+            raise RuntimeError('{} {} answered {}'.format(method, url, response.status_code))
+        if self.enabled:
+            endpoint = self.adapter.match(urlsplit(url).path, method)[0]
+            self.samples[endpoint].append((elapsed, int(response.headers['X-DB-Queries'])))
+        response.close()
+        return response
+
+
+class Driver(object):
+    """The user scenarios, as weighted methods."""
+
+    def __init__(self, app, recorder, rng, accuracy=0.8, max_rounds=10):
+        self.app = app
+        self.recorder = recorder
+        self.rng = rng
+        self.accuracy = accuracy
+        self.max_rounds = max_rounds
+        with app.app_context():
+            from app import catalog
+            self.reference = catalog.data
+
+    def quiz(self, client):
+        game_type = self.rng.choice(QUIZZES)
+        url = self.recorder.request(client, '/quick_new_game/' + game_type).location
+        for round_ in range(self.max_rounds + 1):
+            self.recorder.request(client, url)
+            right = round_ < self.max_rounds and self.rng.random() < self.accuracy
+            response = self.recorder.request(client, url, 'POST',
+                                             self.answer(game_type, url, right))
+            url = response.location
+            if game_type not in url:
+                return
+
+    def answer(self, game_type, url, right):
+        if 'region' in game_type:
+            return {'{}.x'.format(right): 1}
+        question = self.reference.pools[game_type].get(int(url.rstrip('/').split('/')[-1]))
+        correct = {'Red': bool(question.red), 'White': bool(question.white)}
+        # a red and white AOC cannot be answered wrong, the game goes on
+        buttons = [button for button, ok in sorted(correct.items()) if ok == right] or \
+            sorted(correct)
+        return {'submit-button': self.rng.choice(buttons)}
+
+    def index(self, client):
+        self.recorder.request(client, '/index')
+
+    def explore_users(self, client):
+        self.recorder.request(client, '/explore_users')
+
+    def identity_cards(self, client):
+        reference = self.reference
+        self.recorder.request(client, '/grape_identity_card/{}'.format(
+            self.rng.choice(reference.grape_ids)))
+        self.recorder.request(client, '/aoc_identity_card/{}'.format(
+            self.rng.choice(reference.aoc_ids)))
+
+    def explore_reference(self, client):
+        self.recorder.request(client, '/explore_grapes')
+        self.recorder.request(client, '/explore_aocs')
+
+    SCENARIOS = [('quiz', 40), ('index', 25), ('explore_users', 10),
+                 ('identity_cards', 15), ('explore_reference', 10)]
+
+    def run(self, clients, iterations):
+        names, weights = zip(*self.SCENARIOS)
+        for _ in range(iterations):
+            scenario = self.rng.choices(names, weights)[0]
+            getattr(self, scenario)(self.rng.choice(clients))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def summarize(samples):
+    report = {}
+    for endpoint, rows in sorted(samples.items()):
+        times = [row[0] for row in rows]
+        queries = [row[1] for row in rows]
+        report[endpoint] = {
+            'requests': len(rows),
+            'rps': round(len(times) / sum(times), 1),
+            'p50_ms': round(percentile(times, 0.5) * 1000, 2),
+            'p99_ms': round(percentile(times, 0.99) * 1000, 2),
+            'queries': round(sum(queries) / len(queries), 2),
+            'max_queries': max(queries),
+        }
+    return report
+
+
+def print_report(report, baseline=None, out=sys.stdout):
+    header = '{:<28} {:>8} {:>9} {:>9} {:>9} {:>8}'.format(
+        'endpoint', 'requests', 'req/s', 'p50 ms', 'p99 ms', 'queries')
+    out.write(header + ('  vs baseline' if baseline else '') + '\n')
+    for endpoint, row in report.items():
+        line = '{:<28} {:>8} {:>9} {:>9} {:>9} {:>8}'.format(
+            endpoint, row['requests'], row['rps'], row['p50_ms'], row['p99_ms'], row['queries'])
+        base = (baseline or {}).get(endpoint)
+        if base:
+            line += '  p50 {:+.0%} queries {:+g}'.format(row['p50_ms'] / base['p50_ms'] - 1,
+                                                       round(row['queries'] - base['queries'], 2))
+        out.write(line + '\n')
+
+
+def regressions(report, baseline, tolerance):
+    """Endpoints slower than the baseline by more than ``tolerance`` at p50,
+    or running more queries."""
+    found = []
+    for endpoint, row in report.items():
+        base = baseline.get(endpoint)
+        if base is None:
+            continue
+        if row['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            found.append('{}: p50 {} ms, was {} ms'.format(endpoint, row['p50_ms'], base['p50_ms']))
+        if row['queries'] > base['queries'] + 0.5:
+            found.append('{}: {} queries, was {}'.format(endpoint, row['queries'], base['queries']))
+    return found
+
+
+def baseline_path(name):
+    return os.path.join(BASELINES, '{}.json'.format(name))
+
+
+def run(app, iterations=500, warmup=50, users=20, seed=1):
+    from app.models import User
+    random.seed(seed)
+    rng = random.Random(seed)
+    recorder = Recorder(app)
+    with app.app_context():
+        user_ids = [row[0] for row in User.query.with_entities(User.id).order_by(User.id)]
+    clients = []
+    for user_id in rng.sample(user_ids, min(users, len(user_ids))):
+        client = app.test_client()
+        client.post('/auth/login', data={'username': 'user{}'.format(user_id),
+                                         'password': PASSWORD})
+        clients.append(client)
+    driver = Driver(app, recorder, rng)
+    recorder.enabled = False
+    driver.run(clients, warmup)
+    recorder.enabled = True
+    start = perf_counter()
+    driver.run(clients, iterations)
+    elapsed = perf_counter() - start
+    requests = sum(len(rows) for rows in recorder.samples.values())
+    return summarize(recorder.samples), round(requests / elapsed, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the quiz and explore hot paths.')
+    parser.add_argument('--db', default=DEFAULT_DATABASE, help='Database made by benchmarks.seed.')
+    parser.add_argument('--scale', type=float, default=0.01,
+                        help='Scale used to seed the database when it does not exist.')
+    parser.add_argument('--iterations', type=int, default=500, help='Scenarios to run.')
+    parser.add_argument('--warmup', type=int, default=50, help='Scenarios run before measuring.')
+    parser.add_argument('--users', type=int, default=20, help='Logged in clients.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', metavar='NAME', help='Save the results as a baseline.')
+    parser.add_argument('--compare', metavar='NAME', help='Compare with a saved baseline.')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='p50 slowdown tolerated by --compare.')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    from benchmarks.seed import seed
+    app = create_app(bench_config(args.db))
+    if not os.path.exists(args.db):
+        seed(app, args.scale, args.seed)
+    report, total_rps = run(app, args.iterations, args.warmup, args.users, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(baseline_path(args.compare)) as f:
+            baseline = json.load(f)['endpoints']
+    print_report(report, baseline)
+    print('{} req/s overall'.format(total_rps))
+
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        with open(baseline_path(args.save), 'w') as f:
+            json.dump({'iterations': args.iterations, 'seed': args.seed,
+                       'python': platform.python_version(), 'machine': platform.machine(),
+                       'rps': total_rps, 'endpoints': report}, f, indent=1, sort_keys=True)
+    if baseline is not None:
+        found = regressions(report, baseline, args.tolerance)
+        for line in found:
+            print('REGRESSION ' + line)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,201 @@
+"""Synthetic database for the benchmarks.
+
+Everything derives from ``--seed``, so two databases seeded with the same
+options hold the same users, games and posts (only the dates follow the
+day of the seeding). The rows are written with executemany inserts, the
+timelines and player statistics are then rebuilt by the application's
+own code, and the leaderboards are computed while the games are drawn.
+"""
+import argparse
+import heapq
+import os
+import random
+from datetime import datetime, timedelta
+from hashlib import md5
+from time import perf_counter
+from werkzeug.security import generate_password_hash
+from benchmarks import DEFAULT_DATABASE, PASSWORD, bench_config
+
+USERS = 100000
+GAMES = 2000000
+POSTS = 1000000
+FOLLOWS = 10
+CHUNK = 10000
+
+SYLLABLES = ['al', 'bar', 'ca', 'char', 'do', 'fer', 'gre', 'len', 'mar', 'mour', 'nac',
+             'no', 'pi', 'ro', 'san', 'sau', 'syr', 'ter', 'ti', 'vi', 'vio', 'gnon']
+WORDS = ['fruity', 'round', 'tannic', 'mineral', 'oaky', 'crisp', 'long', 'spicy',
+         'floral', 'buttery', 'earthy', 'fresh', 'jammy', 'smoky', 'nutty']
+
+
+def chunks(rows, size=CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert(db, table, rows):
+    count = 0
+    for chunk in chunks(rows):
+        db.session.execute(table.insert(), chunk)
+        db.session.commit()
+        count += len(chunk)
+    return count
+
+
+def wine_name(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+
+
+def grapes(rng, copies, vineyards):
+    id_ = 0
+    for copy in range(copies):
+        for _ in range(60):
+            id_ += 1
+            chosen = rng.sample(vineyards, rng.randint(0, 4))
+            yield {'id': id_, 'name': '{} {}'.format(wine_name(rng), copy) if copy else wine_name(rng),
+                   'regions': ', '.join(v.capitalize() for v in chosen),
+                   'vineyards': ', '.join(chosen), 'departments': '',
+                   'area_fr': rng.choice([None, rng.randint(10, 60000)]),
+                   'area_world': rng.choice([None, rng.randint(100, 300000)]),
+                   'red': rng.random() < 0.5}
+
+
+def aocs(rng, copies, vineyards):
+    id_ = 0
+    for copy in range(copies):
+        for _ in range(360):
+            id_ += 1
+            name = '{}-{}'.format(wine_name(rng), wine_name(rng))
+            yield {'id': id_, 'name': '{} {}'.format(name, copy) if copy else name,
+                   'vineyard': rng.choice(vineyards).capitalize(),
+                   'style': rng.randint(1, 63)}
+
+
+def users(rng, count, now):
+    password_hash = generate_password_hash(PASSWORD)
+    for id_ in range(1, count + 1):
+        email = 'user{}@example.com'.format(id_)
+        yield {'id': id_, 'username': 'user{}'.format(id_), 'email': email,
+               'avatar_hash': md5(email.encode('utf-8')).hexdigest(),
+               'password_hash': password_hash,
+               'about_me': ' '.join(rng.sample(WORDS, 3)),
+               'last_seen': now - timedelta(seconds=rng.randint(0, 30 * 86400))}
+
+
+def follows(rng, count, per_user):
+    for follower in range(1, count + 1):
+        for followed in rng.sample(range(1, count + 1), min(per_user + 1, count)):
+            if followed != follower:
+                yield {'follower_id': follower, 'followed_id': followed}
+
+
+def posts(rng, count, user_count, now):
+    for id_ in range(1, count + 1):
+        yield {'id': id_, 'body': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 12))),
+               'timestamp': now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+               'user_id': rng.randint(1, user_count), 'language': 'en'}
+
+
+def games(rng, count, user_count, game_types, now, boards):
+    for id_ in range(1, count + 1):
+        game = {'id': id_, 'player_id': rng.randint(1, user_count),
+                'game_type': rng.choice(game_types), 'score': int(rng.expovariate(0.25)),
+                'timestamp': now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+                'is_over': rng.random() < 0.99, 'token': None}
+        if game['is_over']:
+            boards.record(game)
+        yield game
+
+
+class Boards(object):
+    """Top ``size`` finished games of every leaderboard, fed game by game."""
+
+    def __init__(self, size, window_start):
+        self.size = size
+        self.window_start = window_start
+        self.heaps = {}
+
+    def record(self, game):
+        day = game['timestamp'].date()
+        entry = (game['score'], -game['timestamp'].timestamp(), game['player_id'],
+                 game['timestamp'])
+        for game_type in (game['game_type'], 'all'):
+            for board_day in (None, day) if day >= self.window_start else (None,):
+                heap = self.heaps.setdefault((game_type, board_day), [])
+                if len(heap) < self.size:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+
+    def rows(self):
+        for (game_type, day), heap in self.heaps.items():
+            for score, _, player_id, timestamp in heap:
+                yield {'game_type': game_type, 'day': day, 'score': score,
+                       'player_id': player_id, 'timestamp': timestamp}
+
+
+def seed(app, scale=0.01, seed_=1, follows_per_user=FOLLOWS, reference_copies=None, log=print):
+    from app import db
+    from app.models import User, Post, Game, Grape, AOC, TimelineEntry, PlayerStats, \
+        LeaderboardEntry, ReferenceVersion, followers
+    rng = random.Random(seed_)
+    now = datetime.utcnow()
+    user_count = max(2, int(USERS * scale))
+    reference_copies = reference_copies or max(1, round(10 * scale))
+    vineyards = app.config['VINEYARDS']
+    game_types = sorted(app.config['GAMES_TO_NAMES'])
+    boards = Boards(app.config['LEADERBOARD_SIZE'],
+                    now.date() - timedelta(days=app.config['LEADERBOARD_WINDOW']))
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        steps = [
+            ('grapes', lambda: insert(db, Grape.__table__, grapes(rng, reference_copies, vineyards))),
+            ('aocs', lambda: insert(db, AOC.__table__, aocs(rng, reference_copies, vineyards))),
+            ('users', lambda: insert(db, User.__table__, users(rng, user_count, now))),
+            ('followers', lambda: insert(db, followers, follows(rng, user_count, follows_per_user))),
+            ('posts', lambda: insert(db, Post.__table__,
+                                     posts(rng, int(POSTS * scale), user_count, now))),
+            ('games', lambda: insert(db, Game.__table__,
+                                     games(rng, int(GAMES * scale), user_count, game_types,
+                                           now, boards))),
+            ('leaderboard entries', lambda: insert(db, LeaderboardEntry.__table__, boards.rows())),
+            ('timeline entries', lambda: TimelineEntry.rebuild() or TimelineEntry.query.count()),
+            ('player stats', lambda: PlayerStats.rebuild() or PlayerStats.query.count()),
+        ]
+        for name, step in steps:
+            start = perf_counter()
+            count = step()
+            log('{:>10} {:<20} {:.1f}s'.format(count, name, perf_counter() - start))
+        ReferenceVersion.bump()
+        db.session.execute('ANALYZE')
+        db.session.commit()
+    return user_count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed the benchmark database.')
+    parser.add_argument('--db', default=DEFAULT_DATABASE, help='SQLite file to (re)create.')
+    parser.add_argument('--scale', type=float, default=0.01,
+                        help='1 is 100k users, 2M games and 1M posts.')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--follows', type=int, default=FOLLOWS, help='Users followed by each user.')
+    parser.add_argument('--reference-copies', type=int, default=None,
+                        help='Copies of the 60 grapes and 360 AOCs (default: 10 x scale).')
+    args = parser.parse_args(argv)
+    from app import create_app
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    app = create_app(bench_config(args.db))
+    seed(app, args.scale, args.seed, args.follows, args.reference_copies)
+
+
+if __name__ == '__main__':
+    main()
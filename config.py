@@ -18,10 +18,30 @@ class Config(object):
     ADMINS = ['your-email@example.com']
     LANGUAGES = ['en', 'es']
     MS_TRANSLATOR_KEY = os.environ.get('MS_TRANSLATOR_KEY')
+    MS_TRANSLATOR_REGION = os.environ.get('MS_TRANSLATOR_REGION')
+    TRANSLATOR_BACKEND = os.environ.get('TRANSLATOR_BACKEND') or 'microsoft'
+    TRANSLATOR_TIMEOUT = float(os.environ.get('TRANSLATOR_TIMEOUT') or 5)
+    TRANSLATOR_CACHE_SIZE = int(os.environ.get('TRANSLATOR_CACHE_SIZE') or 1024)
     POSTS_PER_PAGE = 25
     GRAPES_PER_PAGE = 10
     AOC_PER_PAGE = 10
     USERS_PER_PAGE = 5
+    LEADERBOARD_SIZE = 20
+    LEADERBOARD_WINDOW = 7
+    QUIZ_SIGNED_ROUNDS = os.environ.get('QUIZ_SIGNED_ROUNDS') is not None
+    QUIZ_ROUND_EXPIRATION = int(os.environ.get('QUIZ_ROUND_EXPIRATION') or 3600)
+    LAST_SEEN_THRESHOLD = int(os.environ.get('LAST_SEEN_THRESHOLD') or 300)
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL') or 60)
+    REFERENCE_CHECK_INTERVAL = int(os.environ.get('REFERENCE_CHECK_INTERVAL') or 30)
+    SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND') or 'auto'
+    JOBS_DATABASE = os.environ.get('JOBS_DATABASE') or os.path.join(basedir, 'jobs.db')
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 5)
+    AVATAR_BACKEND = os.environ.get('AVATAR_BACKEND') or 'gravatar'
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD') or 0.5)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    METRICS_ALLOWED_IPS = (os.environ.get('METRICS_ALLOWED_IPS') or '127.0.0.1,::1').split(',')
+    METRICS_DIR = os.environ.get('METRICS_DIR')
 
     GAMES_TO_NAMES = dict([('quiz_grape_color', 'Grape Color Quiz'),
                            ('quiz_grape_region', 'Grape Region Quiz'),
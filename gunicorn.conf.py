@@ -0,0 +1,10 @@
+import os
+
+
+def child_exit(server, worker):
+    # keep the metrics of the exited worker out of the way of a new
+    # worker reusing its pid
+    directory = os.environ.get('METRICS_DIR')
+    if directory:
+        from app.metrics import ProcessFiles
+        ProcessFiles(directory).retire(worker.pid)
@@ -0,0 +1,48 @@
+"""AOC style bitmask
+
+Revision ID: 0c8d5a7e3f12
+Revises: f1b3e58c2a06
+Create Date: 2026-10-18 11:26:18.934502
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0c8d5a7e3f12'
+down_revision = 'f1b3e58c2a06'
+branch_labels = None
+depends_on = None
+
+# the bits of app.styles, copied so that the migration never changes
+FLAGS = [
+    ('still_white_wine', 1),
+    ('still_rose_wine', 2),
+    ('still_red_wine', 4),
+    ('sparkly_white_wine', 8),
+    ('sparkly_rose_wine', 16),
+    ('sparkly_red_wine', 32),
+]
+
+
+def upgrade():
+    with op.batch_alter_table('AOC', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('style', sa.SmallInteger(), nullable=True))
+    op.execute('UPDATE "AOC" SET style = ' + ' + '.join(
+        'coalesce({}, 0) * {}'.format(name, bit) for name, bit in FLAGS))
+    with op.batch_alter_table('AOC', schema=None) as batch_op:
+        for name, _ in FLAGS:
+            batch_op.drop_column(name)
+        batch_op.create_index(batch_op.f('ix_AOC_style'), ['style'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('AOC', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_AOC_style'))
+        for name, _ in FLAGS:
+            batch_op.add_column(sa.Column(name, sa.Boolean(), nullable=True))
+    op.execute('UPDATE "AOC" SET ' + ', '.join(
+        '{0} = (coalesce(style, 0) & {1}) != 0'.format(name, bit) for name, bit in FLAGS))
+    with op.batch_alter_table('AOC', schema=None) as batch_op:
+        batch_op.drop_column('style')
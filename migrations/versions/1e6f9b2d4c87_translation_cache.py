@@ -0,0 +1,28 @@
+"""translation cache
+
+Revision ID: 1e6f9b2d4c87
+Revises: 0c8d5a7e3f12
+Create Date: 2026-10-18 11:51:37.662085
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e6f9b2d4c87'
+down_revision = '0c8d5a7e3f12'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('translation',
+    sa.Column('key', sa.String(length=40), nullable=False),
+    sa.Column('text', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('key')
+    )
+
+
+def downgrade():
+    op.drop_table('translation')
@@ -0,0 +1,39 @@
+"""user avatar hash
+
+Revision ID: 2a9c7e15b3d4
+Revises: 1e6f9b2d4c87
+Create Date: 2026-10-18 12:17:52.391870
+
+"""
+from hashlib import md5
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a9c7e15b3d4'
+down_revision = '1e6f9b2d4c87'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('avatar_hash', sa.String(length=32), nullable=True))
+        batch_op.create_index(batch_op.f('ix_user_avatar_hash'), ['avatar_hash'], unique=False)
+
+    # the digests of the existing users, as Avatars.backfill()
+    user = sa.table('user', sa.column('id', sa.Integer), sa.column('email', sa.String),
+                    sa.column('avatar_hash', sa.String))
+    conn = op.get_bind()
+    rows = conn.execute(sa.select([user.c.id, user.c.email]).where(
+        user.c.email.isnot(None))).fetchall()
+    for id_, email in rows:
+        conn.execute(user.update().where(user.c.id == id_).values(
+            avatar_hash=md5(email.lower().encode('utf-8')).hexdigest()))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_avatar_hash'))
+        batch_op.drop_column('avatar_hash')
@@ -0,0 +1,95 @@
+"""users, posts, games and reference data
+
+Revision ID: 5cd4ae726000
+Revises:
+Create Date: 2018-06-10 18:42:17.301521
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5cd4ae726000'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('AOC',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=140), nullable=True),
+    sa.Column('vineyard', sa.String(length=140), nullable=True),
+    sa.Column('still_white_wine', sa.Boolean(), nullable=True),
+    sa.Column('still_rose_wine', sa.Boolean(), nullable=True),
+    sa.Column('still_red_wine', sa.Boolean(), nullable=True),
+    sa.Column('sparkly_white_wine', sa.Boolean(), nullable=True),
+    sa.Column('sparkly_rose_wine', sa.Boolean(), nullable=True),
+    sa.Column('sparkly_red_wine', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('grape',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=140), nullable=True),
+    sa.Column('regions', sa.String(length=140), nullable=True),
+    sa.Column('vineyards', sa.String(length=140), nullable=True),
+    sa.Column('departments', sa.String(length=140), nullable=True),
+    sa.Column('area_fr', sa.Integer(), nullable=True),
+    sa.Column('area_world', sa.Integer(), nullable=True),
+    sa.Column('red', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_grape_red'), 'grape', ['red'], unique=False)
+    op.create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=64), nullable=True),
+    sa.Column('email', sa.String(length=120), nullable=True),
+    sa.Column('password_hash', sa.String(length=128), nullable=True),
+    sa.Column('about_me', sa.String(length=140), nullable=True),
+    sa.Column('last_seen', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_email'), 'user', ['email'], unique=True)
+    op.create_index(op.f('ix_user_username'), 'user', ['username'], unique=True)
+    op.create_table('followers',
+    sa.Column('follower_id', sa.Integer(), nullable=True),
+    sa.Column('followed_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['followed_id'], ['user.id'], ),
+    sa.ForeignKeyConstraint(['follower_id'], ['user.id'], )
+    )
+    op.create_table('game',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('player_id', sa.Integer(), nullable=True),
+    sa.Column('game_type', sa.String(length=140), nullable=True),
+    sa.Column('score', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('is_over', sa.Boolean(), nullable=True),
+    sa.ForeignKeyConstraint(['player_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_game_game_type'), 'game', ['game_type'], unique=False)
+    op.create_table('post',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('body', sa.String(length=140), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('language', sa.String(length=5), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_post_timestamp'), 'post', ['timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_post_timestamp'), table_name='post')
+    op.drop_table('post')
+    op.drop_index(op.f('ix_game_game_type'), table_name='game')
+    op.drop_table('game')
+    op.drop_table('followers')
+    op.drop_index(op.f('ix_user_username'), table_name='user')
+    op.drop_index(op.f('ix_user_email'), table_name='user')
+    op.drop_table('user')
+    op.drop_index(op.f('ix_grape_red'), table_name='grape')
+    op.drop_table('grape')
+    op.drop_table('AOC')
@@ -0,0 +1,29 @@
+"""reference version
+
+Revision ID: a3f1c9d2e4b7
+Revises: 5cd4ae726000
+Create Date: 2026-10-18 09:12:04.118350
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c9d2e4b7'
+down_revision = '5cd4ae726000'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('reference_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('reference_version')
@@ -0,0 +1,28 @@
+"""game token
+
+Revision ID: b81e4d0c7a25
+Revises: a3f1c9d2e4b7
+Create Date: 2026-10-18 09:40:51.602217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b81e4d0c7a25'
+down_revision = 'a3f1c9d2e4b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('token', sa.String(length=32), nullable=True))
+        batch_op.create_unique_constraint('uq_game_token', ['token'])
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_game_token', type_='unique')
+        batch_op.drop_column('token')
@@ -0,0 +1,36 @@
+"""player stats
+
+Revision ID: c5d27f8e1b93
+Revises: b81e4d0c7a25
+Create Date: 2026-10-18 10:05:33.870142
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d27f8e1b93'
+down_revision = 'b81e4d0c7a25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('player_stats',
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('game_type', sa.String(length=140), nullable=False),
+    sa.Column('nb_played', sa.Integer(), nullable=True),
+    sa.Column('best_score', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['player_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('player_id', 'game_type')
+    )
+    # the statistics of the games finished before the table existed
+    op.execute('INSERT INTO player_stats (player_id, game_type, nb_played, best_score) '
+               'SELECT player_id, game_type, count(id), max(score) FROM game '
+               'WHERE is_over = 1 AND player_id IS NOT NULL AND game_type IS NOT NULL '
+               'GROUP BY player_id, game_type')
+
+
+def downgrade():
+    op.drop_table('player_stats')
@@ -0,0 +1,64 @@
+"""leaderboard entry
+
+Revision ID: d9a4b6e2f071
+Revises: c5d27f8e1b93
+Create Date: 2026-10-18 10:21:09.447915
+
+"""
+from datetime import datetime, timedelta
+from alembic import op
+import sqlalchemy as sa
+from flask import current_app
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9a4b6e2f071'
+down_revision = 'c5d27f8e1b93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    leaderboard_entry = op.create_table('leaderboard_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('game_type', sa.String(length=140), nullable=True),
+    sa.Column('day', sa.Date(), nullable=True),
+    sa.Column('score', sa.Integer(), nullable=True),
+    sa.Column('player_id', sa.Integer(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['player_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_leaderboard_entry_board', 'leaderboard_entry', ['game_type', 'day', 'score'], unique=False)
+    op.create_index(op.f('ix_leaderboard_entry_day'), 'leaderboard_entry', ['day'], unique=False)
+
+    # fill the boards with the games finished before the table existed
+    game = sa.table('game', sa.column('player_id', sa.Integer), sa.column('game_type', sa.String),
+                    sa.column('score', sa.Integer), sa.column('timestamp', sa.DateTime),
+                    sa.column('is_over', sa.Boolean))
+    size = current_app.config.get('LEADERBOARD_SIZE', 20)
+    window_start = datetime.utcnow().date() - timedelta(
+        days=current_app.config.get('LEADERBOARD_WINDOW', 7))
+    boards = {}
+    rows = op.get_bind().execute(sa.select([game]).where(game.c.is_over == sa.true()))
+    for player_id, game_type, score, timestamp, _ in rows:
+        if game_type is None or score is None or timestamp is None:
+            continue
+        days = (None, timestamp.date()) if timestamp.date() >= window_start else (None,)
+        for board_type in (game_type, 'all'):
+            for day in days:
+                boards.setdefault((board_type, day), []).append(
+                    {'game_type': board_type, 'day': day, 'score': score,
+                     'player_id': player_id, 'timestamp': timestamp})
+    entries = []
+    for board in boards.values():
+        board.sort(key=lambda entry: (-entry['score'], entry['timestamp']))
+        entries.extend(board[:size])
+    if entries:
+        op.bulk_insert(leaderboard_entry, entries)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_leaderboard_entry_day'), table_name='leaderboard_entry')
+    op.drop_index('ix_leaderboard_entry_board', table_name='leaderboard_entry')
+    op.drop_table('leaderboard_entry')
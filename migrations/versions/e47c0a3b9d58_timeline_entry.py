@@ -0,0 +1,39 @@
+"""timeline entry
+
+Revision ID: e47c0a3b9d58
+Revises: d9a4b6e2f071
+Create Date: 2026-10-18 10:48:26.013774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e47c0a3b9d58'
+down_revision = 'd9a4b6e2f071'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('timeline_entry',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['post_id'], ['post.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_timeline_entry_feed', 'timeline_entry', ['user_id', 'timestamp', 'post_id'], unique=False)
+    # the followed posts and the own posts of every user, as TimelineEntry.rebuild()
+    op.execute('INSERT INTO timeline_entry (user_id, post_id, timestamp) '
+               'SELECT followers.follower_id, post.id, post.timestamp FROM followers '
+               'JOIN post ON followers.followed_id = post.user_id '
+               'UNION SELECT post.user_id, post.id, post.timestamp FROM post '
+               'WHERE post.user_id IS NOT NULL')
+
+
+def downgrade():
+    op.drop_index('ix_timeline_entry_feed', table_name='timeline_entry')
+    op.drop_table('timeline_entry')
@@ -0,0 +1,24 @@
+"""post author timestamp index
+
+Revision ID: f1b3e58c2a06
+Revises: e47c0a3b9d58
+Create Date: 2026-10-18 11:02:45.250691
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b3e58c2a06'
+down_revision = 'e47c0a3b9d58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_post_user_id_timestamp', 'post', ['user_id', 'timestamp'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_post_user_id_timestamp', table_name='post')
@@ -1,19 +1,59 @@
 #!/usr/bin/env python
 from datetime import datetime, timedelta
+from hashlib import md5
+import base64
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
 import unittest
-from app import create_app, db
-from app.models import User, Post
+from unittest import mock
+from app import create_app, db, mail, catalog, presence, styles, translator, jobs, \
+    response_cache
+from app.assets import AssetBuilder, Image, asset_url, brotli
+from app.avatars import evict, identicon_path, render_identicon, store_identicon
+from app.email import send_email
+from app.importers import import_file, read_aoc_snapshot, read_aocs, read_grapes, sync, upsert
+from app.jobs import task
+from app.language import backfill_languages, submit_post
+from app.metrics import ProcessFiles, Registry
+from app.models import User, Post, Grape, AOC, Game, PlayerStats, LeaderboardEntry, TimelineEntry, \
+    get_player_stats, get_players_stats
+from app.pagination import cursor_paginate, paginate_sorted
+from app.translate import MicrosoftBackend, TranslationError, translate
+from app.vineyards import VineyardNormalizer
+from benchmarks import bench_config
+from benchmarks.run import regressions, run
+from benchmarks.seed import seed
 from config import Config
+from sqlalchemy.exc import OperationalError
 
 
 class TestConfig(Config):
     TESTING = True
+    WTF_CSRF_ENABLED = False
     SQLALCHEMY_DATABASE_URI = 'sqlite://'
 
 
-class UserModelCase(unittest.TestCase):
+class AppTestCase(unittest.TestCase):
+    """An application built from ``config`` and an empty database per test.
+
+    ``settings`` returns the values that change with every test, such as
+    temporary paths; they go on top of ``config`` in a subclass made for
+    the test, so the shared config classes are never modified.
+    """
+    config = TestConfig
+
+    def settings(self):
+        return {}
+
     def setUp(self):
-        self.app = create_app(TestConfig)
+        self.app = create_app(type(self.config.__name__, (self.config,), self.settings()))
         self.app_context = self.app.app_context()
         self.app_context.push()
         db.create_all()
@@ -23,6 +63,18 @@ class UserModelCase(unittest.TestCase):
         db.drop_all()
         self.app_context.pop()
 
+    def login(self, username='susan', password='cat'):
+        """Add a user and log a test client in as that user."""
+        u = User(username=username, email='{}@example.com'.format(username))
+        u.set_password(password)
+        db.session.add(u)
+        db.session.commit()
+        self.client = self.app.test_client()
+        self.client.post('/auth/login', data={'username': username, 'password': password})
+        return u
+
+
+class UserModelCase(AppTestCase):
     def test_password_hashing(self):
         u = User(username='susan')
         u.set_password('cat')
@@ -96,6 +148,1017 @@ class UserModelCase(unittest.TestCase):
         self.assertEqual(f3, [p3, p4])
         self.assertEqual(f4, [p4])
 
+    def test_timeline(self):
+        u1 = User(username='john', email='john@example.com')
+        u2 = User(username='susan', email='susan@example.com')
+        u3 = User(username='mary', email='mary@example.com')
+        u4 = User(username='david', email='david@example.com')
+        db.session.add_all([u1, u2, u3, u4])
+        now = datetime.utcnow()
+        p1, p2, p3, p4 = [Post(body='post from {}'.format(u.username), author=u,
+                               timestamp=now + timedelta(seconds=seconds))
+                          for u, seconds in [(u1, 1), (u2, 4), (u3, 3), (u4, 2)]]
+        db.session.add_all([p1, p2, p3, p4])
+        db.session.commit()
+        u1.follow(u2)
+        u1.follow(u4)
+        u2.follow(u3)
+        u3.follow(u4)
+        db.session.commit()
+
+        # the materialized timelines hold the followed posts
+        for u, f in [(u1, [p2, p4, p1]), (u2, [p2, p3]), (u3, [p3, p4]), (u4, [p4])]:
+            self.assertEqual(cursor_paginate(
+                u.timeline(), [TimelineEntry.timestamp, TimelineEntry.post_id],
+                None, 10, key=lambda p: (p.timestamp, p.id)).items, f)
+
+        # new posts are fanned out, unfollowing removes them
+        p5 = Post(body="another post from david", author=u4,
+                  timestamp=now + timedelta(seconds=5))
+        db.session.add(p5)
+        db.session.commit()
+        self.assertEqual(u1.timeline().count(), 4)
+        self.assertEqual(u3.timeline().count(), 3)
+        u1.unfollow(u4)
+        db.session.commit()
+        self.assertEqual(u1.timeline().count(), 2)
+        db.session.delete(p2)
+        db.session.commit()
+        self.assertEqual(u1.timeline().count(), 1)
+        TimelineEntry.rebuild()
+        self.assertEqual(u1.timeline().count(), 1)
+        self.assertEqual(u3.timeline().count(), 3)
+
+    def test_cursor_pagination(self):
+        u = User(username='john', email='john@example.com')
+        db.session.add(u)
+        now = datetime.utcnow()
+        posts = [Post(body=str(i), author=u, timestamp=now + timedelta(seconds=i // 2))
+                 for i in range(7)]
+        db.session.add_all(posts)
+        db.session.commit()
+        expected = sorted(posts, key=lambda p: (p.timestamp, p.id), reverse=True)
+
+        def page(cursor):
+            return cursor_paginate(Post.query, [Post.timestamp, Post.id], cursor, 3)
+
+        p1 = page(None)
+        self.assertFalse(p1.has_prev)
+        p2 = page(p1.next_cursor)
+        p3 = page(p2.next_cursor)
+        self.assertEqual(p1.items + p2.items + p3.items, expected)
+        self.assertFalse(p3.has_next)
+        self.assertEqual(page(p3.prev_cursor).items, p2.items)
+        back = page(p2.prev_cursor)
+        self.assertEqual(back.items, p1.items)
+        self.assertFalse(back.has_prev)
+        self.assertEqual(page('garbage').items, p1.items)
+
+        # crafted cursors fall back to the first page
+        def craft(values):
+            return base64.urlsafe_b64encode(json.dumps(['next', values]).encode()).decode()
+
+        for values in ([{}, 1], [{'t': 'soon'}, 1], [{'t': 0}, 'one'], [{'t': 10 ** 20}, 1],
+                       [1, {'t': 0}], 'values'):
+            self.assertEqual(page(craft(values)).items, p1.items, values)
+        self.login()
+        for url in ('/index', '/explore_users', '/user/john', '/explore_grapes'):
+            r = self.client.get(url, query_string={'cursor': craft([{'t': 'soon'}, 'one'])})
+            self.assertEqual(r.status_code, 200, url)
+
+
+class PlayerStatsCase(AppTestCase):
+    def test_stats(self):
+        u1 = User(username='john', email='john@example.com')
+        u2 = User(username='susan', email='susan@example.com')
+        db.session.add_all([u1, u2])
+        db.session.commit()
+        for score, game_type in [(3, 'quiz_grape_color'), (5, 'quiz_grape_color'),
+                                 (2, 'quiz_grape_color'), (1, 'quiz_aoc_region')]:
+            game = Game(player_id=u1.id, game_type=game_type, score=score,
+                        is_over=True)
+            db.session.add(game)
+            PlayerStats.record(game)
+            db.session.commit()
+
+        summary, nb_played = get_player_stats(u1)
+        self.assertEqual(nb_played, 4)
+        by_type = {row['type']: row for row in summary}
+        self.assertEqual(len(by_type), 4)
+        self.assertEqual(by_type['quiz_grape_color']['nb_played'], 3)
+        self.assertEqual(by_type['quiz_grape_color']['best'], 5)
+        self.assertEqual(by_type['quiz_aoc_region']['best'], 1)
+        self.assertEqual(by_type['quiz_aoc_color']['best'], '-')
+
+        stats = get_players_stats([u1, u2])
+        self.assertEqual(stats[u2.id][1], 0)
+
+        # an unfinished game is not counted by the rebuild
+        db.session.add(Game(player_id=u2.id, game_type='quiz_aoc_color', score=9))
+        db.session.commit()
+        PlayerStats.rebuild()
+        self.assertEqual(get_players_stats([u1, u2]), stats)
+
+
+class LeaderboardConfig(TestConfig):
+    LEADERBOARD_SIZE = 3
+
+
+class LeaderboardCase(AppTestCase):
+    config = LeaderboardConfig
+
+    def setUp(self):
+        super(LeaderboardCase, self).setUp()
+        self.user = User(username='john', email='john@example.com')
+        db.session.add(self.user)
+        db.session.commit()
+
+    def finish_game(self, score, game_type='quiz_grape_color', days_ago=0):
+        game = Game(player_id=self.user.id, game_type=game_type, score=score, is_over=True,
+                    timestamp=datetime.utcnow() - timedelta(days=days_ago))
+        db.session.add(game)
+        LeaderboardEntry.record(game)
+        db.session.commit()
+
+    def test_top_k(self):
+        for score in [4, 1, 7, 3, 9]:
+            self.finish_game(score)
+        self.finish_game(5, game_type='quiz_aoc_color')
+        self.finish_game(8, days_ago=30)
+
+        def scores(*args, **kwargs):
+            return [e.score for e in LeaderboardEntry.top(*args, **kwargs)]
+
+        self.assertEqual(scores('quiz_grape_color'), [9, 8, 7])
+        self.assertEqual(scores('quiz_aoc_color'), [5])
+        self.assertEqual(scores(), [9, 8, 7])
+        self.assertEqual(scores(days=7), [9, 7, 5])
+        self.assertEqual(scores('quiz_grape_color', days=7), [9, 7, 4])
+        self.assertEqual(LeaderboardEntry.board('all', None).count(), 3)
+
+        LeaderboardEntry.rebuild()
+        self.assertEqual(scores(), [9, 8, 7])
+        self.assertEqual(scores(days=7), [9, 7, 5])
+
+
+class PresenceConfig(TestConfig):
+    LAST_SEEN_THRESHOLD = 60
+    LAST_SEEN_FLUSH_INTERVAL = 3600
+
+
+class PresenceCase(AppTestCase):
+    config = PresenceConfig
+
+    def test_buffered_last_seen(self):
+        long_ago = datetime.utcnow() - timedelta(hours=1)
+        u1 = User(username='john', email='john@example.com', last_seen=long_ago)
+        u2 = User(username='susan', email='susan@example.com',
+                  last_seen=datetime.utcnow())
+        db.session.add_all([u1, u2])
+        db.session.commit()
+
+        presence.touch(u1)
+        presence.touch(u2)
+        db.session.expire_all()
+        self.assertEqual(u1.last_seen, long_ago)
+
+        presence.flush()
+        self.assertGreater(u1.last_seen, long_ago)
+        self.assertEqual(self.app.extensions['presence'].pending, {})
+
+    def test_flush_on_exit(self):
+        long_ago = datetime.utcnow() - timedelta(hours=1)
+        u = User(username='john', email='john@example.com', last_seen=long_ago)
+        db.session.add(u)
+        db.session.commit()
+        presence.touch(u)
+        user_id = u.id
+        presence.shutdown(self.app)
+        self.assertGreater(User.query.get(user_id).last_seen, long_ago)
+
+
+class TranslationConfig(TestConfig):
+    TRANSLATOR_BACKEND = 'local'
+    TRANSLATOR_CACHE_SIZE = 2
+
+
+class TranslationCase(AppTestCase):
+    config = TranslationConfig
+
+    def test_cached_translations(self):
+        backend = translator.backend
+        self.assertEqual(translate('hola', 'es', 'en'), '[en] hola')
+        self.assertEqual(translate('hola', 'es', 'en'), '[en] hola')
+        self.assertEqual(backend.calls, 1)
+
+        # one backend call for every text missing from the caches
+        self.assertEqual(translator.translate_many(['uno', 'hola', 'dos'], 'es', 'en'),
+                         ['[en] uno', '[en] hola', '[en] dos'])
+        self.assertEqual(backend.calls, 2)
+        self.assertEqual(len(translator.cache.data), 2)
+
+        # evicted entries are found again in the translation table
+        self.assertEqual(translate('hola', 'es', 'en'), '[en] hola')
+        self.assertEqual(backend.calls, 2)
+
+    def test_translate_batch(self):
+        self.login()
+        client = self.client
+        r = client.post('/translate_batch', json={
+            'dest_language': 'en',
+            'posts': [{'id': 1, 'text': 'hola', 'source_language': 'es'},
+                      {'id': 2, 'text': 'salut', 'source_language': 'fr'}]})
+        self.assertEqual(r.get_json()['translations'],
+                         {'1': '[en] hola', '2': '[en] salut'})
+
+        for body in [None, [], {'posts': []}, {'dest_language': 'en', 'posts': {}},
+                     {'dest_language': 'en', 'posts': [{'text': 'hola'}]},
+                     {'dest_language': 'en', 'posts': [{'id': 1}]}]:
+            self.assertEqual(client.post('/translate_batch', json=body).status_code, 400)
+        r = client.post('/translate_batch', data='{', content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+
+    def test_malformed_service_response(self):
+        class Response(object):
+            status_code = 200
+
+            def __init__(self, content):
+                self.content = content
+
+        class Session(object):
+            def __init__(self, content):
+                self.content = content
+
+            def post(self, *args, **kwargs):
+                return Response(self.content)
+
+        self.app.config['MS_TRANSLATOR_KEY'] = 'key'
+        backend = MicrosoftBackend(self.app)
+        backend.session = Session(b'[{"translations": [{"text": "hello"}]}]')
+        self.assertEqual(backend.translate(['hola'], 'es', 'en'), ['hello'])
+        for content in [b'<html>', b'{}', b'[{"translations": []}]', b'[{"error": 1}]', b'[]']:
+            backend.session = Session(content)
+            with self.app.test_request_context(), self.assertRaises(TranslationError):
+                backend.translate(['hola'], 'es', 'en')
+
+
+class LanguageDetectionCase(AppTestCase):
+    def test_detection(self):
+        u = User(username='susan', email='susan@example.com')
+        post = Post(body='Este es un mensaje escrito en castellano para la prueba',
+                    author=u)
+        old = Post(body='This is a message written in English for the test',
+                   author=u)
+        db.session.add_all([u, post, old])
+        db.session.commit()
+        self.assertIsNone(post.language)
+
+        submit_post(post)
+        self.assertEqual(post.language, 'es')
+        self.assertEqual(backfill_languages(), 1)
+        self.assertEqual(old.language, 'en')
+        self.assertEqual(backfill_languages(), 0)
+
+
+class JobConfig(TestConfig):
+    JOBS_EAGER = False
+    JOB_WORKERS = 0
+    JOB_MAX_ATTEMPTS = 2
+    JOB_RETRY_BACKOFF = 0
+
+
+@task('always_fails')
+def always_fails():
+    raise ValueError('boom')
+
+
+class JobQueueCase(AppTestCase):
+    config = JobConfig
+
+    def settings(self):
+        return {'JOBS_DATABASE': self.path}
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        super(JobQueueCase, self).setUp()
+
+    def tearDown(self):
+        super(JobQueueCase, self).tearDown()
+        os.remove(self.path)
+
+    def test_queued_language_detection(self):
+        u = User(username='susan', email='susan@example.com')
+        p1 = Post(body='Este es un mensaje escrito en castellano para la prueba',
+                  author=u)
+        p2 = Post(body='This is a message written in English for the test',
+                  author=u)
+        db.session.add_all([u, p1, p2])
+        db.session.commit()
+        submit_post(p1)
+        submit_post(p2)
+        self.assertEqual(jobs.depth(), 2)
+        self.assertIsNone(p1.language)
+        ids = [p1.id, p2.id]
+
+        self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual(jobs.depth(), 0)
+        self.assertEqual([Post.query.get(id_).language for id_ in ids], ['es', 'en'])
+
+    def test_retries(self):
+        jobs.enqueue('always_fails')
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(jobs.store.counts(), [('queued', 1)])
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(jobs.store.counts(), [('failed', 1)])
+        self.assertEqual(jobs.run_pending(), 0)
+
+    def test_email_batch(self):
+        for name in ['john', 'susan']:
+            send_email('Hello', sender='admin@example.com',
+                       recipients=['{}@example.com'.format(name)],
+                       text_body='Hi {}'.format(name), html_body='<p>Hi</p>')
+        with mail.record_messages() as outbox:
+            self.assertEqual(jobs.run_pending(), 2)
+        self.assertEqual([m.recipients for m in outbox],
+                         [['john@example.com'], ['susan@example.com']])
+        self.assertEqual(jobs.store.counts(), [('done', 2)])
+
+    def test_email_without_server(self):
+        self.app.extensions['mail'].suppress = False
+        send_email('Reset Your Password', sender='admin@example.com',
+                   recipients=['john@example.com'], text_body='token: s3cr3t',
+                   html_body='<p>token: s3cr3t</p>')
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            self.assertEqual(jobs.run_pending(), 1)
+        self.assertIn('john@example.com: Reset Your Password', '\n'.join(logs.output))
+        self.assertNotIn('s3cr3t', '\n'.join(logs.output))
+
+    def test_failed_email_retried_alone(self):
+        for recipients in [['john@example.com'], [], ['susan@example.com']]:
+            send_email('Hello', sender='admin@example.com', recipients=recipients,
+                       text_body='Hi', html_body='<p>Hi</p>')
+        with mail.record_messages() as outbox:
+            self.assertEqual(jobs.run_pending(), 3)
+            self.assertEqual(jobs.store.counts(), [('done', 2), ('queued', 1)])
+            self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual([m.recipients for m in outbox],
+                         [['john@example.com'], ['susan@example.com']])
+        self.assertEqual(jobs.store.counts(), [('done', 2), ('failed', 1)])
+
+    def test_lease_timeout(self):
+        job_id = jobs.enqueue('always_fails')
+        # a worker claims the job and dies before reporting it
+        self.assertEqual([job[0] for job in jobs.store.claim(1)], [job_id])
+        self.assertEqual(jobs.run_pending(), 0)
+        self.assertEqual(jobs.store.counts(), [('running', 1)])
+
+        jobs.store.connect().execute('UPDATE job SET claimed_at = claimed_at - ?',
+                                     (self.app.config['JOB_LEASE_TIMEOUT'] + 1,))
+        self.assertEqual(jobs.run_pending(), 1)
+        # the expired lease and the failed run are the two attempts
+        self.assertEqual(jobs.store.counts(), [('failed', 1)])
+        self.assertEqual(jobs.depth(), 0)
+
+
+class ImporterCase(AppTestCase):
+    def test_grapes(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static_data.tsv')
+        errors = []
+        with open(path, encoding='utf-8', newline='') as f:
+            counts = upsert(Grape, read_grapes(f, errors), batch_size=20)
+        self.assertEqual(errors, [])
+        self.assertEqual(counts['inserted'], 53)
+        merlot = Grape.query.filter_by(name='Merlot').one()
+        self.assertTrue(merlot.red)
+        self.assertEqual(merlot.area_fr, 112200)
+
+        with open(path, encoding='utf-8', newline='') as f:
+            counts = upsert(Grape, read_grapes(f, errors))
+        self.assertEqual((counts['inserted'], counts['updated'], counts['unchanged']),
+                         (0, 0, 53))
+
+    def test_aocs(self):
+        lines = ['id\tname\tvineyard\tstill_white_wine\tstill_rose_wine\tstill_red_wine\t'
+                 'sparkly_white_wine\tsparkly_rose_wine\tsparkly_red_wine\n',
+                 '1\tChablis\tBourgogne\tTRUE\tFALSE\tFALSE\tFALSE\tFALSE\tFALSE\n',
+                 '2\t\tBourgogne\tTRUE\tFALSE\tFALSE\tFALSE\tFALSE\tFALSE\n',
+                 '3\tCrémant de Loire\tLoire\tFALSE\tFALSE\tFALSE\tmaybe\tFALSE\tFALSE\n']
+        errors = []
+        counts = upsert(AOC, read_aocs(lines, errors))
+        self.assertEqual(counts['inserted'], 1)
+        self.assertEqual([line for line, message in errors], [3, 4])
+        self.assertEqual(AOC.query.get(1).style, styles.STILL_WHITE)
+
+        lines[1] = lines[1].replace('FALSE\tFALSE\tFALSE\n', 'TRUE\tFALSE\tFALSE\n')
+        counts = upsert(AOC, read_aocs(lines[:2], []))
+        self.assertEqual(counts['updated'], 1)
+        self.assertEqual(AOC.query.get(1).style, styles.STILL_WHITE | styles.SPARKLY_WHITE)
+
+    def test_aoc_snapshot(self):
+        def snapshot(*rows):
+            return io.StringIO(
+                '<html><body><table><tr><td>menu</td></tr></table>'
+                '<div id="mw-content-text"><table>'
+                '<tr><th>Appellation</th><th>Vignoble</th></tr>' +
+                ''.join('<tr>' + ''.join('<td>{}</td>'.format(cell) for cell in row) + '</tr>'
+                        for row in rows) +
+                '</table><table><tr><td>other</td></tr></table></div></body></html>')
+
+        ajaccio = ['AJACCIO', 'Corse', 'x', 'x', 'x', '', '', '']
+        anjou = ['Anjou-Villages', 'Val de Loire', '', '', 'x', '', '', '']
+        errors = []
+        counts = sync(AOC, read_aoc_snapshot(snapshot(ajaccio, anjou), errors, chunk_size=50),
+                      errors, key='name')
+        self.assertEqual((errors, counts['inserted']), ([], 2))
+        self.assertEqual([(a.name, a.vineyard, a.style) for a in AOC.query.order_by(AOC.id)],
+                         [('Ajaccio', 'Corse', styles.STILL), ('Anjou-villages', 'Val de loire',
+                                                              styles.STILL_RED)])
+
+        errors = []
+        counts = sync(AOC, read_aoc_snapshot(snapshot(ajaccio, anjou), errors), errors,
+                      key='name')
+        self.assertEqual((counts['unchanged'], counts['updated'], counts['deleted']), (2, 0, 0))
+
+        # a new appellation at the top of the table shifts the rows, not the ids
+        ids = {a.name: a.id for a in AOC.query}
+        ajaccio[5] = 'x'
+        alsace = ['Alsace', 'Alsace', 'x', '', '', '', '', '']
+        errors = []
+        counts = sync(AOC, read_aoc_snapshot(snapshot(alsace, ajaccio), errors), errors,
+                      key='name')
+        self.assertEqual((counts['inserted'], counts['updated'], counts['deleted']), (1, 1, 1))
+        self.assertEqual(AOC.query.filter_by(name='Ajaccio').one().id, ids['Ajaccio'])
+        self.assertEqual(AOC.query.filter_by(name='Ajaccio').one().style,
+                         styles.STILL | styles.SPARKLY_WHITE)
+        self.assertEqual(sorted(a.name for a in AOC.query), ['Ajaccio', 'Alsace'])
+
+        # a rejected row, or a page without the table, deletes nothing
+        errors = []
+        counts = sync(AOC, read_aoc_snapshot(snapshot(alsace, ['Ajaccio', 'Corse']), errors),
+                      errors, key='name')
+        self.assertEqual(counts['deleted'], 0)
+        self.assertEqual([line for line, message in errors], [2, None])
+        errors = []
+        counts = sync(AOC, read_aoc_snapshot(io.StringIO('<html><body></body></html>'), errors),
+                      errors, key='name')
+        self.assertEqual((counts['deleted'], len(errors)), (0, 1))
+        self.assertEqual(AOC.query.count(), 2)
+
+        # without delete_missing, a snapshot import never deletes
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'aocs.html')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(snapshot(alsace).getvalue())
+        counts, errors = import_file('aocs', path)
+        self.assertEqual((counts['unchanged'], counts['deleted'], errors), (1, 0, []))
+        self.assertEqual(AOC.query.count(), 2)
+
+
+class MemorySearchConfig(TestConfig):
+    SEARCH_BACKEND = 'memory'
+
+
+class SearchCase(AppTestCase):
+    def test_search(self):
+        u = User(username='susan', email='susan@example.com')
+        db.session.add_all([
+            u,
+            Grape(id=1, name='Mourvèdre', regions='Provence', departments='Var'),
+            Grape(id=2, name='Merlot', regions='Bordeaux'),
+            AOC(id=1, name='Côtes du Rhône', vineyard='Vallée du Rhône'),
+            AOC(id=2, name='Côte Rôtie', vineyard='Vallée du Rhône'),
+            Post(body='Un verre de mourvèdre ce soir', author=u)])
+        db.session.commit()
+
+        self.assertEqual([g.id for g in Grape.search('mourvedre')], [1])
+        self.assertEqual([g.id for g in Grape.search('bord')], [2])
+        self.assertEqual([a.id for a in AOC.search('cotes rho')], [1])
+        self.assertEqual([a.id for a in AOC.search('rotie')], [2])
+        self.assertEqual(sorted(a.id for a in AOC.search('VALLEE')), [1, 2])
+        self.assertEqual(AOC.search('cote bourgogne'), [])
+        self.assertEqual(len(Post.search('mourv')), 1)
+
+        post = Post(body='Le Merlot de Pomerol', author=u)
+        db.session.add(post)
+        db.session.commit()
+        self.assertEqual([p.id for p in Post.search('pomerol')], [post.id])
+        db.session.delete(post)
+        db.session.commit()
+        self.assertEqual(Post.search('pomerol'), [])
+
+
+class MemorySearchCase(SearchCase):
+    config = MemorySearchConfig
+
+
+class ReferenceCatalogCase(AppTestCase):
+    def setUp(self):
+        super(ReferenceCatalogCase, self).setUp()
+        db.session.add_all([
+            Grape(id=1, name='Aligoté', vineyards='bourgogne', red=False),
+            Grape(id=2, name='Syrah', vineyards='rhone, languedoc', red=True),
+            Grape(id=4, name='Tannat', vineyards='', red=True),
+            AOC(id=1, name='Chablis', vineyard='Bourgogne',
+                still_white_wine=True),
+            AOC(id=2, name='Crémant de Loire', vineyard='Val de loire',
+                sparkly_white_wine=True, sparkly_rose_wine=True),
+            AOC(id=3, name='Chinon', vineyard='Val de loire',
+                still_red_wine=True, still_rose_wine=True),
+        ])
+        db.session.commit()
+
+    def test_snapshot(self):
+        reference = catalog.data
+        self.assertEqual(reference.grape_ids, (1, 2, 4))
+        self.assertEqual(reference.grapes[2].name, 'Syrah')
+        self.assertEqual(reference.aocs[1].style, styles.STILL_WHITE)
+        self.assertIs(catalog.data, reference)
+
+    def test_vineyard_normalizer(self):
+        normalize = VineyardNormalizer(Config.VINEYARDS).normalize
+        self.assertEqual(normalize('Vallée du Rhône'), {'rhone'})
+        self.assertEqual(normalize('Languedoc-roussillon'), {'languedoc'})
+        self.assertEqual(normalize('bourgogne, beaujolais, Sud - Ouest'),
+                         {'bourgogne', 'sud-ouest'})
+        self.assertEqual(normalize('Lorraine'), {'champagne'})
+        self.assertEqual(normalize(''), frozenset())
+        self.assertEqual(catalog.data.grapes[2].vineyard_set,
+                         {'rhone', 'languedoc'})
+
+    def test_neighbors(self):
+        reference = catalog.data
+        self.assertEqual(reference.grape_neighbors(1), (None, 2))
+        self.assertEqual(reference.grape_neighbors(2), (1, 4))
+        self.assertEqual(reference.grape_neighbors(4), (2, None))
+        self.assertEqual(reference.grape_neighbors(3), (2, 4))
+        self.assertEqual(reference.aoc_neighbors(1), (None, 2))
+
+    def test_question_pools(self):
+        pools = catalog.data.pools
+        self.assertEqual(len(pools['quiz_grape_color']), 3)
+        region = pools['quiz_grape_region']
+        self.assertNotIn(4, region)
+        self.assertEqual(region.get(2).positive_vineyards,
+                         ('languedoc', 'rhone'))
+        self.assertNotIn('rhone', region.get(2).negative_vineyards)
+        for _ in range(20):
+            self.assertIn(region.draw().id, (1, 2))
+        aoc = pools['quiz_aoc_region'].get(1)
+        self.assertEqual(aoc.positive_vineyards, ('bourgogne',))
+        self.assertTrue(pools['quiz_aoc_color'].get(1).white)
+
+    def test_style_bitmask(self):
+        chinon = AOC.query.get(3)
+        self.assertEqual(chinon.style, styles.STILL_RED | styles.STILL_ROSE)
+        chinon.still_rose_wine = False
+        self.assertFalse(chinon.still_rose_wine)
+        self.assertTrue(chinon.still_red_wine)
+        db.session.commit()
+        self.assertEqual(AOC.query.filter(AOC.still_red_wine).all(), [chinon])
+
+        catalog.bump()
+        self.assertEqual(catalog.data.aocs[3].style, styles.STILL_RED)
+
+    def test_bump_reloads(self):
+        version = catalog.data.version
+        db.session.add(Grape(id=3, name='Merlot', red=True))
+        db.session.commit()
+        self.assertNotIn(3, catalog.data.grapes)
+        catalog.bump()
+        self.assertEqual(catalog.data.version, version + 1)
+        self.assertEqual(catalog.data.grapes[3].name, 'Merlot')
+
+    def test_suggest(self):
+        reference = catalog.data
+        self.assertEqual([name for kind, id_, name in reference.suggest('ch')],
+                         ['Chinon', 'Chablis'])
+        self.assertEqual(reference.suggest('CRÉMANT'), [('aoc', 2, 'Crémant de Loire')])
+        self.assertEqual(reference.suggest('cremant-de l'), [('aoc', 2, 'Crémant de Loire')])
+        self.assertEqual(reference.suggest('loi'), [('aoc', 2, 'Crémant de Loire')])
+        self.assertEqual(reference.suggest('aligote'), [('grape', 1, 'Aligoté')])
+        self.assertEqual(len(reference.suggest('c', limit=1)), 1)
+        self.assertEqual(reference.suggest(' - '), [])
+
+
+class SignedRoundsConfig(TestConfig):
+    QUIZ_SIGNED_ROUNDS = True
+
+
+class SignedRoundsCase(AppTestCase):
+    config = SignedRoundsConfig
+
+    def setUp(self):
+        super(SignedRoundsCase, self).setUp()
+        db.session.add(Grape(id=1, name='Syrah', red=True))
+        self.login()
+
+    def test_single_write_per_game(self):
+        url = self.client.get('/quick_new_game/quiz_grape_color').location
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, 200)
+            url = self.client.post(
+                url, data={'submit-button': 'Red'}).location
+            self.assertIn('quiz_grape_color', url)
+        self.assertEqual(Game.query.count(), 0)
+        self.client.post(url, data={'submit-button': 'White'})
+        game = Game.query.one()
+        self.assertEqual(game.score, 3)
+        self.assertTrue(game.is_over)
+
+        # replaying the last round cannot record the game twice
+        self.client.post(url, data={'submit-button': 'White'})
+        self.assertEqual(Game.query.count(), 1)
+        self.assertEqual(Post.query.count(), 1)
+        self.assertEqual(PlayerStats.query.one().nb_played, 1)
+
+    def test_tampered_token(self):
+        url = self.client.get('/quick_new_game/quiz_grape_color').location
+        game_id = url.split('/')[-2]
+        tampered = url.replace(game_id, game_id[:-2] + 'xx')
+        self.assertEqual(self.client.get(tampered).status_code, 404)
+
+
+class ResponseCacheCase(AppTestCase):
+    def setUp(self):
+        super(ResponseCacheCase, self).setUp()
+        db.session.add_all([Grape(id=i, name='Grape {}'.format(i)) for i in range(1, 24)])
+        self.login()
+
+    def test_etags(self):
+        r = self.client.get('/grape_identity_card/3')
+        self.assertEqual(r.status_code, 200)
+        etag = r.headers['ETag']
+        r = self.client.get('/grape_identity_card/3', headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 304)
+        self.assertEqual(r.data, b'')
+        r = self.client.get('/grape_identity_card/4', headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 200)
+
+        catalog.bump()
+        r = self.client.get('/grape_identity_card/3', headers={'If-None-Match': etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r.headers['ETag'], etag)
+        self.assertIsNotNone(r.last_modified)
+
+    def test_fragments_and_pages(self):
+        seen = []
+        url = '/explore_grapes'
+        while url:
+            r = self.client.get(url)
+            seen.extend(int(id_) for id_ in re.findall(r'<td>(\d+)</td>', r.get_data(as_text=True)))
+            url = re.search(r'href="(/explore_grapes\?cursor=[^"]+)">\s*Next', r.get_data(as_text=True))
+            url = url and url.group(1)
+        self.assertEqual(seen, list(range(1, 24)))
+        self.assertEqual(len(response_cache.fragments), 23)
+
+        page = paginate_sorted(catalog.data.grape_ids, None, 10)
+        page = paginate_sorted(catalog.data.grape_ids, page.next_cursor, 10)
+        self.assertEqual(page.items, list(range(11, 21)))
+        page = paginate_sorted(catalog.data.grape_ids, page.prev_cursor, 10)
+        self.assertEqual((page.items, page.has_prev), (list(range(1, 11)), False))
+
+
+class AssetsCase(AppTestCase):
+    def settings(self):
+        return {'ASSETS_FOLDER': self.target}
+
+    def setUp(self):
+        self.source = tempfile.mkdtemp()
+        self.target = os.path.join(self.source, 'build')
+        os.makedirs(os.path.join(self.source, 'css'))
+        with open(os.path.join(self.source, 'css', 'site.css'), 'w') as f:
+            f.write('body { color: #800020; }\n' * 50)
+        with open(os.path.join(self.source, 'logo.gif'), 'wb') as f:
+            f.write(b'GIF89a')
+        self.manifest = AssetBuilder(self.source, self.target).build()
+        super(AssetsCase, self).setUp()
+
+    def tearDown(self):
+        super(AssetsCase, self).tearDown()
+        shutil.rmtree(self.source)
+
+    def test_build(self):
+        self.assertEqual(sorted(self.manifest), ['css/site.css', 'logo.gif'])
+        css = self.manifest['css/site.css']
+        self.assertRegex(css, r'^css/site\.[0-9a-f]{12}\.css$')
+        self.assertTrue(os.path.exists(os.path.join(self.target, css + '.gz')))
+        self.assertFalse(os.path.exists(os.path.join(self.target, self.manifest['logo.gif'] + '.gz')))
+        # building twice gives the same names
+        self.assertEqual(AssetBuilder(self.source, self.target).build(), self.manifest)
+
+    def test_serve(self):
+        with self.app.test_request_context():
+            url = asset_url('css/site.css')
+            self.assertEqual(url, '/assets/' + self.manifest['css/site.css'])
+            self.assertEqual(asset_url('warning.png'), '/static/warning.png')
+        client = self.app.test_client()
+        r = client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(r.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(r.mimetype, 'text/css')
+        self.assertIn('immutable', r.headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(r.data), b'body { color: #800020; }\n' * 50)
+        r = client.get(url)
+        self.assertNotIn('Content-Encoding', r.headers)
+        r.close()
+
+    def test_without_optional_packages(self):
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        shutil.copy(os.path.join(self.source, 'css', 'site.css'), source)
+        with open(os.path.join(source, 'map.png'), 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+        target = os.path.join(source, 'build')
+        with mock.patch('app.assets.Image', None), mock.patch('app.assets.brotli', None):
+            manifest = AssetBuilder(source, target, widths=[2]).build()
+        # the images are only copied, the text files only gzipped
+        self.assertEqual(sorted(manifest), ['map.png', 'site.css'])
+        self.assertTrue(os.path.exists(os.path.join(target, manifest['site.css'] + '.gz')))
+        self.assertFalse(os.path.exists(os.path.join(target, manifest['site.css'] + '.br')))
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_image_variants(self):
+        Image.new('RGB', (8, 4), (128, 0, 32)).save(os.path.join(self.source, 'map.png'))
+        manifest = AssetBuilder(self.source, self.target, widths=[2, 16]).build()
+        self.assertEqual(sorted(name for name in manifest if name.startswith('map')),
+                         ['map.png', 'map.webp', 'map@2w.png', 'map@2w.webp'])
+        with Image.open(os.path.join(self.target, manifest['map@2w.png'])) as image:
+            self.assertEqual(image.size, (2, 1))
+
+    @unittest.skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        path = os.path.join(self.target, self.manifest['css/site.css'] + '.br')
+        with open(path, 'rb') as f:
+            self.assertEqual(brotli.decompress(f.read()), b'body { color: #800020; }\n' * 50)
+
+
+class IdenticonConfig(TestConfig):
+    AVATAR_BACKEND = 'identicon'
+
+
+class AvatarCase(AppTestCase):
+    config = IdenticonConfig
+
+    def settings(self):
+        return {'AVATAR_CACHE_DIR': self.cache_dir}
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        super(AvatarCase, self).setUp()
+
+    def tearDown(self):
+        super(AvatarCase, self).tearDown()
+        shutil.rmtree(self.cache_dir)
+
+    def test_hash_follows_email(self):
+        u = User(username='john', email='John@example.com')
+        self.assertEqual(u.avatar_hash, 'd4c74594d841139328695756648b6bd6')
+        u.email = 'susan@example.com'
+        self.assertEqual(u.avatar_hash, md5(b'susan@example.com').hexdigest())
+
+    def test_identicon(self):
+        u = User(username='john', email='john@example.com')
+        db.session.add(u)
+        db.session.commit()
+        with self.app.test_request_context():
+            url = u.avatar(70)
+        self.assertEqual(url, '/avatar/d4c74594d841139328695756648b6bd6/70.png')
+        client = self.app.test_client()
+        r = client.get(url)
+        self.assertEqual(r.mimetype, 'image/png')
+        self.assertIn('immutable', r.headers['Cache-Control'])
+        self.assertEqual(r.data[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(struct.unpack('>II', r.data[16:24]), (70, 70))
+        r.close()
+        self.assertTrue(os.path.exists(os.path.join(
+            self.cache_dir, 'd4', 'd4c74594d841139328695756648b6bd6-70.png')))
+        self.assertEqual(client.get('/avatar/d4c74594d841139328695756648b6bd6/71.png').status_code, 404)
+        self.assertEqual(client.get('/avatar/not-a-digest/70.png').status_code, 404)
+
+    def test_unknown_digest_not_stored(self):
+        digest = md5(b'nobody@example.com').hexdigest()
+        r = self.app.test_client().get('/avatar/{}/70.png'.format(digest))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data, render_identicon(digest, 70))
+        self.assertNotIn('immutable', r.headers.get('Cache-Control', ''))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_cache_eviction(self):
+        folder = self.cache_dir
+        for i in range(5):
+            path = os.path.join(folder, '{:02d}'.format(i), '{}.png'.format(i))
+            os.makedirs(os.path.dirname(path))
+            open(path, 'wb').close()
+            os.utime(path, (i, i))
+        evict(folder, 2)
+        self.assertEqual(sorted(name for root, dirs, names in os.walk(folder) for name in names),
+                         ['3.png', '4.png'])
+
+    def test_eviction_interval(self):
+        self.app.config.update(AVATAR_CACHE_MAX_FILES=1, AVATAR_EVICT_INTERVAL=3)
+
+        def stored():
+            return sum(len(names) for root, dirs, names in os.walk(self.cache_dir))
+
+        for i in range(3):
+            digest = md5(str(i).encode()).hexdigest()
+            store_identicon(identicon_path(digest, 70), b'png')
+            os.utime(identicon_path(digest, 70), (i, i))
+            self.assertEqual(stored(), [1, 2, 1][i])
+
+
+class QueryCounter(object):
+    """Counts the SQL statements run while the ``with`` block is active."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        db.event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        return self
+
+    def __exit__(self, *exc_info):
+        db.event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+class PostListingQueriesCase(AppTestCase):
+    # statements a post listing may run, whatever the number of authors
+    QUERY_BUDGET = 8
+
+    def setUp(self):
+        super(PostListingQueriesCase, self).setUp()
+        admin = self.login('admin')
+        for i in range(10):
+            author = User(username='author{}'.format(i), email='author{}@example.com'.format(i))
+            db.session.add(Post(body='tasting note {}'.format(i), author=author))
+            db.session.commit()
+            admin.follow(author)
+        db.session.commit()
+
+    def test_query_budget(self):
+        for url in ('/index', '/explore_posts', '/search?q=tasting', '/user/author3'):
+            # the first request also loads the reference data and the search index
+            self.client.get(url)
+            with QueryCounter(db.engine) as queries:
+                r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            self.assertIn(b'author9' if url != '/user/author3' else b'author3', r.data)
+            self.assertLessEqual(len(queries), self.QUERY_BUDGET, '\n'.join([url] + queries.statements))
+
+    def test_deleted_author(self):
+        author = User.query.filter_by(username='author3').one()
+        post_ids = [p.id for p in author.posts]
+        self.client.get('/delete_user/author3')
+        self.assertEqual(TimelineEntry.query.filter(
+            TimelineEntry.post_id.in_(post_ids)).count(), 0)
+        r = self.client.get('/index')
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn(b'tasting note 3', r.data)
+
+        # entries left behind by an earlier deletion are skipped too
+        db.session.add(TimelineEntry(user_id=User.query.filter_by(username='admin').one().id,
+                                     post_id=post_ids[0], timestamp=datetime.utcnow()))
+        db.session.commit()
+        r = self.client.get('/index')
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn(b'tasting note 3', r.data)
+
+
+class InstrumentationConfig(TestConfig):
+    SQL_STATS_HEADERS = True
+    SLOW_QUERY_THRESHOLD = 0
+
+
+class InstrumentationCase(AppTestCase):
+    config = InstrumentationConfig
+
+    def setUp(self):
+        super(InstrumentationCase, self).setUp()
+        self.login()
+
+    def test_request_stats(self):
+        with QueryCounter(db.engine) as queries, \
+                self.assertLogs(self.app.logger, 'WARNING') as logs:
+            r = self.client.get('/user/susan')
+        self.assertEqual(r.headers['X-DB-Queries'], str(len(queries)))
+        self.assertIn('db;dur=', r.headers['Server-Timing'])
+        # every statement is over a threshold of 0
+        self.assertEqual(len(logs.output), len(queries))
+        self.assertIn('slow_query', logs.output[0])
+
+        r = self.client.get('/metrics')
+        self.assertIn('db_queries_total{{endpoint="main.user"}} {}'.format(len(queries)),
+                      r.get_data(as_text=True))
+        self.app.config['METRICS_TOKEN'] = 'secret'
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        r = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(r.status_code, 200)
+
+    def test_request_log(self):
+        self.app.config['SQL_STATS_HEADERS'] = False
+        self.app.config['SLOW_QUERY_THRESHOLD'] = 60
+        with self.assertLogs(self.app.logger, 'DEBUG') as logs:
+            self.client.get('/user/susan')
+        self.assertEqual([(r.levelname, r.getMessage().split()[0]) for r in logs.records],
+                         [('DEBUG', 'request')])
+
+        # over the threshold the request is logged at INFO level
+        self.app.config['SLOW_QUERY_THRESHOLD'] = 0
+        with self.assertLogs(self.app.logger, 'INFO') as logs:
+            self.client.get('/user/susan')
+        self.assertEqual([r.levelname for r in logs.records
+                          if r.getMessage().startswith('slow_request')], ['INFO'])
+
+    def test_failed_statement(self):
+        with db.engine.connect() as connection:
+            with self.assertRaises(OperationalError):
+                connection.execute('SELECT * FROM missing')
+            self.assertNotIn('query_start', connection.info)
+            with self.assertLogs(self.app.logger, 'WARNING') as logs:
+                connection.execute('SELECT 1')
+            self.assertIn('statement="SELECT 1"', logs.output[0])
+
+
+class MetricsCase(AppTestCase):
+    def setUp(self):
+        super(MetricsCase, self).setUp()
+        db.session.add(Grape(id=1, name='Syrah', red=True))
+        self.login()
+
+    def test_exposition(self):
+        url = self.client.get('/quick_new_game/quiz_grape_color').location
+        url = self.client.post(url, data={'submit-button': 'Red'}).location
+        self.client.post(url, data={'submit-button': 'White'})
+        text = self.client.get('/metrics').get_data(as_text=True)
+        for line in ('games_started_total{game_type="quiz_grape_color"} 1',
+                     'games_finished_total{game_type="quiz_grape_color"} 1',
+                     'quiz_answers_total{game_type="quiz_grape_color",result="right"} 1',
+                     'quiz_answers_total{game_type="quiz_grape_color",result="wrong"} 1',
+                     'http_request_duration_seconds_count{endpoint="main.quiz_grape_color",'
+                     'status="302"} 2',
+                     'http_request_duration_seconds_bucket{endpoint="auth.login",status="302",'
+                     'le="+Inf"} 1',
+                     'active_users 1'):
+            self.assertIn(line, text)
+        self.assertIn('# TYPE cache_requests_total counter', text)
+
+    def test_access(self):
+        remote = {'REMOTE_ADDR': '203.0.113.7'}
+        self.assertEqual(self.client.get('/metrics', environ_base=remote).status_code, 403)
+        self.app.config['METRICS_ALLOWED_IPS'] = ['203.0.113.7']
+        self.assertEqual(self.client.get('/metrics', environ_base=remote).status_code, 200)
+
+    def test_worker_files(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        kinds = {'games_started_total': 'counter', 'workers': 'gauge'}
+        files = ProcessFiles(directory)
+        for pid in (os.getpid(), dead.pid):
+            registry = Registry()
+            registry.declare('games_started_total', 'counter', '')
+            registry.declare('workers', 'gauge', '')
+            registry.inc('games_started_total', 2, game_type='quiz_aoc_color')
+            registry.set('workers', 1)
+            files.write(registry.collect(self.app), pid)
+        samples = {(name, labels): value for name, suffix, labels, value in files.read(kinds)}
+        # counters of the exited worker still count, its gauges do not
+        self.assertEqual(samples[('games_started_total', (('game_type', 'quiz_aoc_color'),))], 4)
+        self.assertEqual(samples[('workers', ())], 1)
+
+        # once retired, a new worker with the same pid starts its own file
+        files.retire(dead.pid)
+        registry = Registry()
+        registry.declare('games_started_total', 'counter', '')
+        registry.inc('games_started_total', 1, game_type='quiz_aoc_color')
+        files.write(registry.collect(self.app), dead.pid)
+        samples = {(name, labels): value for name, suffix, labels, value in files.read(kinds)}
+        self.assertEqual(samples[('games_started_total', (('game_type', 'quiz_aoc_color'),))], 5)
+
+
+class BenchmarkCase(unittest.TestCase):
+    def test_seed_and_run(self):
+        path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path))
+        app = create_app(bench_config(path))
+        self.assertEqual(seed(app, scale=0.0005, log=lambda line: None), 50)
+        report, total_rps = run(app, iterations=20, warmup=5, users=3)
+        self.assertIn('main.quick_new_game', report)
+        self.assertEqual(report['main.aoc_identity_card']['queries'], 1)
+        self.assertGreater(total_rps, 0)
+        slower = dict(report, **{'main.index': dict(report['main.index'], queries=99)})
+        self.assertEqual(regressions(report, report, 0.25), [])
+        self.assertEqual(len(regressions(slower, report, 0.25)), 1)
+
 
 if __name__ == '__main__':
     unittest.main(verbosity=2)